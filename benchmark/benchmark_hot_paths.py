@@ -0,0 +1,468 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2011, Dorian Scholz, TU Darmstadt
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#   * Neither the name of the TU Darmstadt nor the names of its
+#     contributors may be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Benchmarks of the hot paths which limit how many topics can be monitored.
+
+The benchmarks run offline: the master and rospy.Subscriber are replaced by
+stubs feeding synthetic messages and time is taken from the wall clock.
+The message classes are generated from the definitions below, so no message
+packages are needed, only rospy and genpy which rqt_topic itself runs on.
+Widgets are created on the offscreen Qt platform unless QT_QPA_PLATFORM is
+set.
+
+Run from a sourced workspace:
+
+    python benchmark/benchmark_hot_paths.py [--topics 200] [--json]
+"""
+
+from __future__ import division, print_function
+import argparse
+import gc
+import io
+import json
+import os
+import sys
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+# prefer the sources next to this script over an installed package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import genpy.dynamic  # noqa: E402
+import roslib.message  # noqa: E402
+import rospy  # noqa: E402
+import rospy.rostime  # noqa: E402
+
+from rqt_topic.profiling import clock  # noqa: E402
+
+
+# set on each received message by rospy, identifies the publisher
+CONNECTION_HEADER = {'callerid': '/benchmark_publisher'}
+
+
+class StubSubscriber(object):
+
+    """
+    Replaces rospy.Subscriber, messages are passed in as serialized buffers.
+    """
+
+    instances = {}
+
+    def __init__(self, name, data_class, callback=None, *args, **kwargs):
+        self.name = name
+        self.data_class = data_class
+        self.callback = callback
+        StubSubscriber.instances[name] = self
+
+    def unregister(self):
+        StubSubscriber.instances.pop(self.name, None)
+
+    def publish(self, buff):
+        # same as the receive path of rospy
+        message = self.data_class()
+        message.deserialize(buff)
+        message._connection_header = CONNECTION_HEADER
+        self.callback(message)
+
+
+# definitions of the synthetic message types and their dependencies
+MESSAGE_DEFINITIONS = {
+    'std_msgs/Header': 'uint32 seq\ntime stamp\nstring frame_id\n',
+    'std_msgs/ColorRGBA': 'float32 r\nfloat32 g\nfloat32 b\nfloat32 a\n',
+    'geometry_msgs/Point': 'float64 x\nfloat64 y\nfloat64 z\n',
+    'geometry_msgs/Vector3': 'float64 x\nfloat64 y\nfloat64 z\n',
+    'geometry_msgs/Quaternion': 'float64 x\nfloat64 y\nfloat64 z\nfloat64 w\n',
+    'geometry_msgs/Pose': 'geometry_msgs/Point position\ngeometry_msgs/Quaternion orientation\n',
+    'sensor_msgs/Imu':
+        'Header header\n'
+        'geometry_msgs/Quaternion orientation\n'
+        'float64[9] orientation_covariance\n'
+        'geometry_msgs/Vector3 angular_velocity\n'
+        'float64[9] angular_velocity_covariance\n'
+        'geometry_msgs/Vector3 linear_acceleration\n'
+        'float64[9] linear_acceleration_covariance\n',
+    'sensor_msgs/Image':
+        'Header header\n'
+        'uint32 height\n'
+        'uint32 width\n'
+        'string encoding\n'
+        'uint8 is_bigendian\n'
+        'uint32 step\n'
+        'uint8[] data\n',
+    'visualization_msgs/Marker':
+        'Header header\n'
+        'string ns\n'
+        'int32 id\n'
+        'int32 type\n'
+        'int32 action\n'
+        'geometry_msgs/Pose pose\n'
+        'geometry_msgs/Vector3 scale\n'
+        'std_msgs/ColorRGBA color\n'
+        'duration lifetime\n'
+        'bool frame_locked\n'
+        'geometry_msgs/Point[] points\n'
+        'std_msgs/ColorRGBA[] colors\n'
+        'string text\n'
+        'string mesh_resource\n'
+        'bool mesh_use_embedded_materials\n',
+    'visualization_msgs/MarkerArray': 'visualization_msgs/Marker[] markers\n',
+}
+MESSAGE_DEPENDENCIES = {
+    'sensor_msgs/Imu': ['std_msgs/Header', 'geometry_msgs/Quaternion', 'geometry_msgs/Vector3'],
+    'sensor_msgs/Image': ['std_msgs/Header'],
+    'visualization_msgs/MarkerArray': [
+        'visualization_msgs/Marker', 'std_msgs/Header', 'geometry_msgs/Pose',
+        'geometry_msgs/Point', 'geometry_msgs/Quaternion', 'geometry_msgs/Vector3',
+        'std_msgs/ColorRGBA'],
+}
+
+_message_classes = {}
+
+
+def generate_message_classes():
+    """
+    Generate the classes of the synthetic message types like rosbag does for
+    the types of a bag file.
+    """
+    for type_name, dependencies in MESSAGE_DEPENDENCIES.items():
+        # concatenated like the full text of the definition in a connection header
+        text = MESSAGE_DEFINITIONS[type_name] + ''.join(
+            '=' * 80 + '\nMSG: %s\n%s' % (dependency, MESSAGE_DEFINITIONS[dependency])
+            for dependency in dependencies)
+        _message_classes.update(genpy.dynamic.generate_dynamic(type_name, text))
+
+
+def get_message_class(type_name, reload_on_error=False):
+    """
+    Replaces roslib.message.get_message_class, only the generated classes are known.
+    """
+    if type_name == 'Header':
+        type_name = 'std_msgs/Header'
+    return _message_classes.get(type_name)
+
+
+def _create_imu(message_class):
+    message = message_class()
+    message.header.frame_id = 'imu_link'
+    message.orientation.w = 1.
+    return message
+
+
+def _create_image(message_class):
+    message = message_class()
+    message.height, message.width, message.step = 480, 640, 1920
+    message.encoding = 'rgb8'
+    message.data = bytes(bytearray(message.height * message.step))
+    return message
+
+
+def _create_marker_array(message_class):
+    marker_class = get_message_class('visualization_msgs/Marker')
+    point_class = get_message_class('geometry_msgs/Point')
+    color_class = get_message_class('std_msgs/ColorRGBA')
+    message = message_class()
+    for marker_id in range(50):
+        marker = marker_class()
+        marker.id = marker_id
+        marker.points = [point_class(x=index, y=index, z=index) for index in range(100)]
+        marker.colors = [color_class(r=1., a=1.) for _ in range(100)]
+        message.markers.append(marker)
+    return message
+
+
+# name, type and factory of the synthetic messages
+MESSAGES = [
+    ('imu', 'sensor_msgs/Imu', _create_imu),
+    ('image', 'sensor_msgs/Image', _create_image),
+    ('marker_array', 'visualization_msgs/MarkerArray', _create_marker_array),
+]
+
+
+def load_messages():
+    """
+    @return: list of (name, type, serialized buffer) of the synthetic messages
+    """
+    messages = []
+    for name, type_name, factory in MESSAGES:
+        message = factory(get_message_class(type_name))
+        buff = io.BytesIO()
+        message.serialize(buff)
+        messages.append((name, type_name, buff.getvalue()))
+    return messages
+
+
+def measure(name, function, calls, setup=None):
+    """
+    Time the calls of a function and measure the memory they allocate.
+
+    The memory is measured in a second run since tracing allocations slows
+    down the calls considerably.
+
+    @param setup: function called before each call, not included in the times
+    @return: dict with the results
+    """
+    durations = []
+    gc.collect()
+    for _ in range(calls):
+        if setup is not None:
+            setup()
+        start = clock()
+        function()
+        durations.append(clock() - start)
+    durations.sort()
+    result = {
+        'benchmark': name,
+        'calls': calls,
+        'mean_us': sum(durations) / calls * 1e6,
+        'p50_us': durations[calls // 2] * 1e6,
+        'p95_us': durations[min(calls - 1, int(calls * 0.95))] * 1e6,
+        'max_us': durations[-1] * 1e6,
+        'retained_kb': None,
+        'peak_kb': None,
+    }
+    if tracemalloc is not None:
+        gc.collect()
+        tracemalloc.start()
+        start_size, _ = tracemalloc.get_traced_memory()
+        for _ in range(calls):
+            if setup is not None:
+                setup()
+            function()
+        size, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result['retained_kb'] = (size - start_size) / 1024.
+        result['peak_kb'] = (peak - start_size) / 1024.
+    return result
+
+
+def benchmark_message_callback(messages, calls):
+    from rqt_topic.topic_info import TopicInfo
+
+    results = []
+    for name, type_name, buff in messages:
+        topic_info = TopicInfo('/benchmark/' + name, type_name)
+        topic_info.start_monitoring()
+        subscriber = StubSubscriber.instances[topic_info._topic_name]
+        # deserialize outside of the timing like the receive thread of rospy does
+        received = []
+
+        def receive():
+            message = subscriber.data_class()
+            message.deserialize(buff)
+            message._connection_header = CONNECTION_HEADER
+            received.append(message)
+
+        def callback():
+            topic_info.message_callback(received.pop())
+
+        results.append(measure(
+            'message_callback[%s, %d bytes]' % (name, len(buff)), callback, calls, receive))
+        results.append(measure(
+            'receive_and_callback[%s]' % name, lambda: subscriber.publish(buff), calls))
+        topic_info.stop_monitoring()
+    return results
+
+
+def benchmark_widget(widget_class, messages, topic_count, calls):
+    from python_qt_binding.QtWidgets import QApplication
+    from rqt_topic import topic_discovery
+    from rqt_topic.topic_index import get_field_paths
+    from rqt_topic.topic_list import diff_topic_lists
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    prefix = widget_class.__name__
+    topics = [
+        ('/benchmark/%s_%d' % (messages[index % len(messages)][0], index),
+         messages[index % len(messages)][1])
+        for index in range(topic_count)]
+    buffers = dict(
+        (topic_name, messages[index % len(messages)][2])
+        for index, (topic_name, _) in enumerate(topics))
+    topic_discovery.get_published_topics = lambda timeout=None: list(topics)
+
+    results = []
+
+    # from constructing the widget until the first topic list is shown,
+    # the discovery runs in the background like in the plugin
+    def start_widget():
+        widget = widget_class()
+        widget.resize(1200, 800)
+        widget.show()
+        widget.start()
+        while widget.startup_duration() is None:
+            app.processEvents()
+        widget.shutdown_plugin()
+        widget.close()
+
+    results.append(measure(
+        '%s.startup[%d topics]' % (prefix, topic_count), start_widget, max(1, calls // 10)))
+    app.processEvents()
+
+    # add all topics at once like the first discovery does
+    widgets = []
+
+    def create_widget():
+        widget = widget_class()
+        widget.resize(1200, 800)
+        widget.show()
+        widgets.append(widget)
+
+    def add_topics():
+        widgets[-1]._handle_topics_discovered(diff_topic_lists({}, dict(topics)))
+
+    results.append(measure(
+        '%s.add_topics[%d topics]' % (prefix, topic_count), add_topics,
+        max(1, calls // 10), create_widget))
+    for widget in widgets[:-1]:
+        widget.shutdown_plugin()
+        widget.close()
+    widget = widgets[-1]
+    app.processEvents()
+
+    if hasattr(widget, 'topics_tree_widget') and widget._tree_view is widget.topics_tree_widget:
+        tree = widget.topics_tree_widget
+        created = []
+
+        def create_items():
+            topic_name, topic_type = topics[len(created) % len(topics)]
+            created.append(widget._recursive_create_widget_items(
+                tree, '%s/copy_%d' % (topic_name, len(created)), topic_type))
+
+        results.append(measure(
+            '%s._recursive_create_widget_items' % prefix, create_items, calls))
+        for item in created:
+            widget._forget_widget_items(item)
+            tree.takeTopLevelItem(tree.indexOfTopLevelItem(item))
+
+    # monitor all topics and show the values of the topmost ones
+    for topic in widget._topics.values():
+        topic['info'].start_monitoring()
+
+    def publish_all():
+        for topic_name, buff in buffers.items():
+            StubSubscriber.instances[topic_name].publish(buff)
+
+    publish_all()
+    widget._update_topics_data()
+    app.processEvents()
+
+    results.append(measure(
+        '%s._update_topics_data[%d topics]' % (prefix, topic_count),
+        widget._update_topics_data, calls, publish_all))
+    results.append(measure(
+        '%s._update_topics_data[%d topics, no new messages]' % (prefix, topic_count),
+        widget._update_topics_data, calls))
+    results.append(measure(
+        '%s.refresh_topics[%d topics]' % (prefix, topic_count), widget.refresh_topics, calls))
+
+    # the topic discovery loads the field paths of new types in the background
+    for _, topic_type in topics:
+        get_field_paths(topic_type)
+
+    # alternate between a query matching topics, one matching fields and none
+    queries = [messages[0][0], 'benchmark orientation', '']
+    filtered = []
+
+    def set_filter_text():
+        widget.set_filter_text(queries[len(filtered) % len(queries)])
+        filtered.append(None)
+
+    results.append(measure(
+        '%s.set_filter_text[%d topics]' % (prefix, topic_count), set_filter_text, calls))
+
+    widget.shutdown_plugin()
+    widget.close()
+    app.processEvents()
+    return results
+
+
+def format_results(results):
+    columns = ['benchmark', 'calls', 'mean_us', 'p50_us', 'p95_us', 'max_us', 'retained_kb',
+               'peak_kb']
+    rows = [columns]
+    for result in results:
+        rows.append([
+            str(result[column]) if isinstance(result[column], (int, str)) else
+            '-' if result[column] is None else '%.1f' % result[column]
+            for column in columns])
+    widths = [max(len(row[column]) for row in rows) for column in range(len(columns))]
+    return '\n'.join(
+        '  '.join([row[0].ljust(widths[0])] + [
+            text.rjust(width) for text, width in zip(row[1:], widths[1:])])
+        for row in rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark the hot paths of rqt_topic offline.')
+    parser.add_argument(
+        '-t', '--topics', type=int, default=200,
+        help='number of topics for the widget benchmarks (default: %(default)s)')
+    parser.add_argument(
+        '-n', '--calls', type=int, default=200,
+        help='number of calls per benchmark (default: %(default)s)')
+    parser.add_argument(
+        '--json', action='store_true', help='print the results as JSON lines')
+    parser.add_argument(
+        '--skip-widgets', action='store_true', help='only benchmark the message callback')
+    args = parser.parse_args(argv)
+
+    # stub the ROS communication and the message packages
+    rospy.rostime.set_rostime_initialized(True)
+    rospy.Subscriber = StubSubscriber
+    generate_message_classes()
+    roslib.message.get_message_class = get_message_class
+
+    messages = load_messages()
+
+    results = benchmark_message_callback(messages, args.calls * 10)
+    if not args.skip_widgets:
+        from rqt_topic.topic_model_widget import TopicModelWidget
+        from rqt_topic.topic_widget import TopicWidget
+        for widget_class in [TopicWidget, TopicModelWidget]:
+            results += benchmark_widget(widget_class, messages, args.topics, args.calls)
+
+    if args.json:
+        for result in results:
+            print(json.dumps(result))
+    else:
+        print(format_results(results))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
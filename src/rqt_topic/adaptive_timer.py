@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2011, Dorian Scholz, TU Darmstadt
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#   * Neither the name of the TU Darmstadt nor the names of its
+#     contributors may be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+from python_qt_binding.QtCore import QObject, QTimer, Slot
+
+from .profiling import clock
+
+
+class AdaptiveTimer(QObject):
+
+    """
+    Calls a function periodically and backs off when the calls get expensive.
+
+    Whenever a call takes longer than max_load times the current interval the
+    interval is increased, up to max_interval. Once calls get cheap again the
+    interval decreases back to the configured one.
+    """
+
+    def __init__(self, callback, interval, max_load=0.25, max_interval=None,
+                 asynchronous=False, parent=None):
+        """
+        @param callback: function called on every tick
+        @param interval: configured interval in milliseconds
+        @param max_load: fraction of the interval a call may take before backing off
+        @param max_interval: upper bound of the interval in milliseconds,
+                             defaults to ten times the configured interval
+        @param asynchronous: the callback only starts work which finishes later, its
+                             duration is passed to report_duration() instead of
+                             measuring the call
+        """
+        super(AdaptiveTimer, self).__init__(parent)
+        self._callback = callback
+        self._asynchronous = asynchronous
+        self._max_load = max_load
+        self._max_interval = max_interval
+        self._interval = interval
+        self._current_interval = interval
+        # duration of the last call in milliseconds
+        self.last_duration = 0.
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._tick)
+        self._active = False
+
+    def interval(self):
+        """
+        @return: configured interval in milliseconds
+        """
+        return self._interval
+
+    def current_interval(self):
+        """
+        @return: interval in milliseconds after backing off
+        """
+        return self._current_interval
+
+    def set_interval(self, interval):
+        self._interval = interval
+        self._current_interval = interval
+        if self._active:
+            self._timer.start(interval)
+
+    def start(self):
+        self._active = True
+        self._timer.start(self._current_interval)
+
+    def stop(self):
+        self._active = False
+        self._timer.stop()
+
+    def is_active(self):
+        return self._active
+
+    def report_duration(self, duration):
+        """
+        Adapt the interval to work started by an asynchronous callback.
+
+        @param duration: duration of the work in milliseconds
+        """
+        self.last_duration = duration
+        self._adapt_interval()
+        if self._active and self._timer.isActive():
+            # the next tick waits for the adapted interval after the work finished
+            self._timer.start(self._current_interval)
+
+    @Slot()
+    def _tick(self):
+        start_time = clock()
+        try:
+            self._callback()
+        finally:
+            if not self._asynchronous:
+                self.last_duration = (clock() - start_time) * 1000.
+                self._adapt_interval()
+            if self._active:
+                self._timer.start(self._current_interval)
+
+    def _adapt_interval(self):
+        max_interval = self._max_interval or 10 * self._interval
+        budget = self._current_interval * self._max_load
+        if self.last_duration > budget:
+            self._current_interval = min(
+                max_interval,
+                max(2 * self._current_interval, int(self.last_duration / self._max_load)))
+        elif self.last_duration < budget / 4 and self._current_interval > self._interval:
+            self._current_interval = max(self._interval, self._current_interval // 2)
@@ -0,0 +1,319 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2011, Dorian Scholz, TU Darmstadt
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#   * Neither the name of the TU Darmstadt nor the names of its
+#     contributors may be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+from __future__ import division, print_function
+import argparse
+import json
+import re
+import sys
+import time
+
+import rospy
+
+from .monitor_scheduler import MonitorScheduler
+from .profiling import clock
+from .statistics_writer import get_topic_statistics, StatisticsWriter
+from .subscription_pool import get_subscription_pool, SubscriptionPool
+from .topic_info import TopicInfo
+from .topic_list import diff_topic_lists, get_published_topics, XmlRpcError
+
+# statistics reported for each topic in the order of the table columns
+_STATISTICS = [
+    ('hz', '%.2f'), ('min_dt', '%.4f'), ('max_dt', '%.4f'),
+    ('bw', '%.0f'), ('size', '%.0f'), ('min_size', '%d'), ('max_size', '%d'),
+    ('latency', '%.4f'), ('overflow', '%d')]
+
+
+class HeadlessMonitor(object):
+
+    """
+    Monitors the rate and bandwidth of many topics without a GUI.
+
+    The topics are discovered periodically and the statistics of all of them
+    are written to a stream, either as a table or as JSON lines.
+
+    With a MonitorScheduler only the topics matching its patterns are
+    monitored, taking turns within its budget. Topics waiting for their turn
+    report the statistics of their last turn and their age.
+    """
+
+    def __init__(self, topic_names=None, window_size=100, output_format='table',
+                 stream=None, timeout=3.0, writer=None, scheduler=None):
+        """
+        @param topic_names: names of the topics to monitor, None for all published topics
+        @param window_size: number of messages the statistics are computed over
+        @param output_format: either 'table' or 'json'
+        @param stream: file object the reports are written to, defaults to stdout
+        @param timeout: timeout of a single master query in seconds
+        @param writer: optional StatisticsWriter each report is also exported to
+        @param scheduler: optional MonitorScheduler deciding which topics are monitored
+        """
+        super(HeadlessMonitor, self).__init__()
+        self._topic_names = set(topic_names) if topic_names else None
+        self._window_size = window_size
+        self._output_format = output_format
+        self._stream = stream
+        self._timeout = timeout
+        self._writer = writer
+        self._scheduler = scheduler
+        # topic name -> type and TopicInfo of the monitored topics
+        self._topic_types = {}
+        self._topics = {}
+
+    def discover_topics(self):
+        """
+        Start and stop monitoring topics according to the published topics.
+        """
+        try:
+            topic_list = get_published_topics(self._timeout)
+        except (IOError, XmlRpcError) as e:
+            rospy.logerr('Communication with rosmaster failed: {0}'.format(e))
+            return
+        topic_types = dict(
+            (topic_name, topic_type) for topic_name, topic_type in topic_list
+            if self._is_selected(topic_name))
+        topic_diff = diff_topic_lists(self._topic_types, topic_types)
+        for topic_name in topic_diff.removed + [name for name, _ in topic_diff.retyped]:
+            self._topics.pop(topic_name).stop_monitoring()
+        for topic_name, topic_type in topic_diff.added + topic_diff.retyped:
+            topic_info = TopicInfo(topic_name, topic_type, self._window_size)
+            if self._scheduler is None:
+                topic_info.start_monitoring()
+            self._topics[topic_name] = topic_info
+        self._topic_types = topic_types
+
+    def _is_selected(self, topic_name):
+        if self._scheduler is not None:
+            return self._scheduler.matches(topic_name)
+        return self._topic_names is None or topic_name in self._topic_names
+
+    def schedule_topics(self):
+        """
+        Start and stop monitoring topics as decided by the scheduler.
+        """
+        if self._scheduler is None:
+            return
+        stamp = rospy.get_time()
+        now = clock()
+        monitored = set(
+            topic_name for topic_name, topic_info in self._topics.items()
+            if topic_info.monitoring)
+        start, stop = self._scheduler.update(
+            list(self._topics.keys()), monitored,
+            lambda topic_name: self._topics[topic_name].get_bw()[0], now)
+        for topic_name in stop:
+            topic_info = self._topics[topic_name]
+            self._scheduler.record_sample(
+                topic_name, get_topic_statistics(
+                    topic_name, self._topic_types[topic_name], topic_info, stamp), now)
+            topic_info.stop_monitoring()
+        for topic_name in start:
+            self._topics[topic_name].start_monitoring()
+
+    def get_statistics(self):
+        """
+        @return: list of OrderedDicts with the statistics of each topic sorted by name,
+                 with a scheduler they also contain the age of the statistics in seconds
+        """
+        stamp = rospy.get_time()
+        now = clock()
+        statistics = []
+        for topic_name in sorted(self._topics):
+            topic_info = self._topics[topic_name]
+            row = get_topic_statistics(
+                topic_name, self._topic_types[topic_name], topic_info, stamp)
+            if self._scheduler is not None:
+                age = 0. if topic_info.monitoring else None
+                if age is None:
+                    sample, age = self._scheduler.get_sample(topic_name, now)
+                    if sample is not None:
+                        row = sample.copy()
+                row['age'] = age
+            statistics.append(row)
+        return statistics
+
+    def write_report(self):
+        self.schedule_topics()
+        for topic_info in self._topics.values():
+            topic_info.fit_buffer_size()
+        stream = self._stream or sys.stdout
+        statistics = self.get_statistics()
+        if self._writer is not None:
+            self._writer.write(statistics)
+        if self._output_format == 'json':
+            for row in statistics:
+                stream.write(json.dumps(row) + '\n')
+        else:
+            stream.write(_format_table(statistics) + '\n\n')
+        stream.flush()
+
+    def spin(self, period=1.0, discovery_period=5.0, count=None):
+        """
+        Write a report every period until shutdown.
+
+        @param period: seconds between reports
+        @param discovery_period: seconds between queries of the published topics
+        @param count: number of reports after which to return, None for no limit
+        """
+        reports = 0
+        next_discovery = clock()
+        next_report = next_discovery + period
+        while not rospy.is_shutdown():
+            now = clock()
+            if now >= next_discovery:
+                self.discover_topics()
+                next_discovery = now + discovery_period
+            if now >= next_report:
+                self.write_report()
+                reports += 1
+                if count is not None and reports >= count:
+                    return
+                # skip reports which are already overdue instead of catching up
+                next_report = max(next_report + period, now)
+            time.sleep(max(0., min(next_discovery, next_report) - clock()))
+
+    def shutdown(self):
+        for topic_info in self._topics.values():
+            topic_info.stop_monitoring()
+        self._topics = {}
+        self._topic_types = {}
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+def _format_table(statistics):
+    columns = list(_STATISTICS)
+    if any('age' in row for row in statistics):
+        columns.append(('age', '%.0f'))
+    header = ['topic'] + [key for key, _ in columns]
+    rows = [header]
+    for row in statistics:
+        rows.append([row['topic']] + [
+            '-' if row[key] is None else value_format % row[key]
+            for key, value_format in columns])
+    widths = [max(len(row[column]) for row in rows) for column in range(len(header))]
+    return '\n'.join(
+        '  '.join([row[0].ljust(widths[0])] + [
+            text.rjust(width) for text, width in zip(row[1:], widths[1:])])
+        for row in rows)
+
+
+def main(argv=None):
+    """
+    Entry point of rqt_topic --headless.
+
+    @param argv: command line arguments including the program name, defaults to sys.argv
+    @return: exit code
+    """
+    argv = rospy.myargv(sys.argv if argv is None else argv)
+    parser = argparse.ArgumentParser(
+        prog='rqt_topic --headless',
+        description='Print the rate and bandwidth of topics periodically without a GUI.')
+    parser.add_argument('--headless', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument(
+        'topics', nargs='*', metavar='TOPIC',
+        help='names of the topics to monitor, all published topics if none are given')
+    parser.add_argument(
+        '--pattern', action='append', default=[], dest='patterns',
+        help='monitor the topics matching a glob like /sensors/** or a regular expression '
+             'prefixed with re:, can be given multiple times, topics take turns if more '
+             'than --max-subscriptions match')
+    parser.add_argument(
+        '--max-subscriptions', type=int, default=20, metavar='COUNT',
+        help='number of topics matching the patterns monitored at once (default: %(default)s)')
+    parser.add_argument(
+        '--max-bandwidth', type=float, default=0., metavar='MB/S',
+        help='total bandwidth of the topics matching the patterns monitored at once, '
+             '0 for no limit (default: %(default)s)')
+    parser.add_argument(
+        '--dwell', type=float, default=5., metavar='SECONDS',
+        help='time a topic matching the patterns is monitored before making room '
+             'for others (default: %(default)s)')
+    parser.add_argument(
+        '-p', '--period', type=float, default=1.0,
+        help='seconds between reports (default: %(default)s)')
+    parser.add_argument(
+        '--discovery-period', type=float, default=5.0,
+        help='seconds between queries of the published topics (default: %(default)s)')
+    parser.add_argument(
+        '-w', '--window', type=int, default=100,
+        help='number of messages the statistics are computed over (default: %(default)s)')
+    parser.add_argument(
+        '-f', '--format', choices=['table', 'json'], default='table',
+        help='print a table or one JSON object per topic and line (default: %(default)s)')
+    parser.add_argument(
+        '-n', '--count', type=int, default=None,
+        help='exit after this number of reports')
+    parser.add_argument(
+        '-q', '--queue-size', type=int, default=SubscriptionPool.DEFAULT_QUEUE_SIZE,
+        help='number of messages queued per connection before the oldest are dropped '
+             'and counted as overflow, 0 for no limit (default: %(default)s)')
+    parser.add_argument(
+        '-o', '--output', metavar='PATH',
+        help='also append the statistics to a CSV file if PATH ends with .csv, '
+             'to a JSON lines file otherwise')
+    parser.add_argument(
+        '--output-max-size', type=float, default=64., metavar='MB',
+        help='size in megabytes after which the output file is rotated (default: %(default)s)')
+    parser.add_argument(
+        '--output-backups', type=int, default=5, metavar='COUNT',
+        help='number of rotated output files to keep (default: %(default)s)')
+    args = parser.parse_args(argv[1:])
+
+    scheduler = None
+    if args.patterns:
+        scheduler = MonitorScheduler(
+            max(1, args.max_subscriptions), args.max_bandwidth * 1000000. or None, args.dwell)
+        try:
+            scheduler.set_patterns(args.patterns)
+        except re.error as e:
+            parser.error('invalid regular expression: %s' % e)
+
+    rospy.init_node('rqt_topic_headless', anonymous=True)
+    get_subscription_pool().set_queue_size(max(0, args.queue_size) or None)
+    writer = None
+    if args.output:
+        writer = StatisticsWriter(
+            args.output, max_bytes=int(args.output_max_size * 1024 * 1024),
+            backup_count=args.output_backups)
+    monitor = HeadlessMonitor(
+        [rospy.resolve_name(topic_name) for topic_name in args.topics],
+        window_size=args.window, output_format=args.format, writer=writer,
+        scheduler=scheduler)
+    try:
+        monitor.spin(args.period, args.discovery_period, args.count)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        monitor.shutdown()
+    return 0
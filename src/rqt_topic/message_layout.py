@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2011, Dorian Scholz, TU Darmstadt
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#   * Neither the name of the TU Darmstadt nor the names of its
+#     contributors may be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+_message_layouts = {}
+_array_types = {}
+
+
+class MessageLayout(object):
+
+    """
+    Fields of a message type, computed once per type by get_message_layout().
+    """
+
+    __slots__ = ('type_name', 'fields')
+
+    def __init__(self, type_name, fields):
+        self.type_name = type_name
+        # list of FieldLayout in the order of the message slots
+        self.fields = fields
+
+
+class FieldLayout(object):
+
+    __slots__ = ('name', 'type_name', 'base_type_name', 'array_size', 'message_layout')
+
+    def __init__(self, name, type_name):
+        self.name = name
+        self.type_name = type_name
+        # array_size is None for non-array fields and 0 for variable-length arrays
+        self.base_type_name, self.array_size = parse_array_type(type_name)
+        # layout of the (element) type or None for primitive types
+        self.message_layout = get_message_layout(self.base_type_name)
+
+
+def get_message_layout(type_name):
+    """
+    Return the cached layout of a message type.
+
+    @param type_name: message type, i.e. 'geometry_msgs/Pose'
+    @return: MessageLayout or None if type_name is not a known message type
+    """
+    try:
+        return _message_layouts[type_name]
+    except KeyError:
+        pass
+    layout = None
+    if '/' in type_name or type_name == 'Header':
+        import roslib.message
+        try:
+            message_class = roslib.message.get_message_class(type_name)
+        except (ValueError, TypeError):
+            message_class = None
+        if message_class is not None:
+            layout = MessageLayout(type_name, [
+                FieldLayout(slot_name, slot_type) for slot_name, slot_type in
+                zip(message_class.__slots__, message_class._slot_types)])
+    _message_layouts[type_name] = layout
+    return layout
+
+
+def parse_array_type(type_name):
+    """
+    Split an array type into element type and size, cached per type.
+
+    @return: (base_type_name, array_size) where array_size is None for
+             non-array types and 0 for variable-length arrays
+    """
+    try:
+        return _array_types[type_name]
+    except KeyError:
+        pass
+    base_type_name = type_name
+    array_size = None
+    if '[' in type_name and type_name[-1] == ']':
+        base_type_name, array_size_str = type_name.split('[', 1)
+        array_size_str = array_size_str[:-1]
+        if len(array_size_str) > 0:
+            array_size = int(array_size_str)
+        else:
+            array_size = 0
+    _array_types[type_name] = (base_type_name, array_size)
+    return base_type_name, array_size
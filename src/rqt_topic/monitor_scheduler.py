@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2011, Dorian Scholz, TU Darmstadt
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#   * Neither the name of the TU Darmstadt nor the names of its
+#     contributors may be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import re
+
+
+def compile_topic_pattern(pattern):
+    """
+    @param pattern: glob where * and ? do not match / but ** matches anything,
+                    e.g. /sensors/**, or a regular expression prefixed with re:
+    @return: compiled regular expression which matches whole topic names
+    @raise re.error: if the regular expression is invalid
+    """
+    if pattern.startswith('re:'):
+        return re.compile('(?:%s)\\Z' % pattern[3:])
+    regex = ''
+    index = 0
+    while index < len(pattern):
+        if pattern.startswith('**', index):
+            regex += '.*'
+            index += 2
+            continue
+        character = pattern[index]
+        if character == '*':
+            regex += '[^/]*'
+        elif character == '?':
+            regex += '[^/]'
+        else:
+            regex += re.escape(character)
+        index += 1
+    return re.compile(regex + '\\Z')
+
+
+class MonitorScheduler(object):
+
+    """
+    Decides which of the topics matching a set of patterns are monitored.
+
+    At most max_subscriptions topics and, if given, max_bandwidth bytes per
+    second are monitored at once. When more topics match they take turns
+    round-robin: topics monitored for at least dwell_time seconds make room
+    for the topics which have been waiting longest. The statistics of a topic
+    are recorded as a sample when it stops, so they can be reported with
+    their age until the topic gets its next turn.
+
+    Topics monitored by other means, e.g. checked by the user, are left alone.
+    """
+
+    def __init__(self, max_subscriptions=20, max_bandwidth=None, dwell_time=5.):
+        """
+        @param max_bandwidth: bytes per second or None for no limit
+        """
+        super(MonitorScheduler, self).__init__()
+        self.max_subscriptions = max_subscriptions
+        self.max_bandwidth = max_bandwidth
+        self.dwell_time = dwell_time
+        self.patterns = []
+        self._regexes = []
+        # topic name -> _ScheduledTopic of the matching topics
+        self._topics = {}
+
+    def set_patterns(self, patterns):
+        """
+        @param patterns: list of patterns as accepted by compile_topic_pattern()
+        @raise re.error: if one of the regular expressions is invalid
+        """
+        self._regexes = [compile_topic_pattern(pattern) for pattern in patterns]
+        self.patterns = list(patterns)
+
+    def matches(self, topic_name):
+        return any(regex.match(topic_name) for regex in self._regexes)
+
+    def is_scheduled(self, topic_name):
+        return topic_name in self._topics
+
+    def is_idle(self):
+        """
+        @return: True if update() has no topics to start or stop
+        """
+        return not self._regexes and not self._topics
+
+    def update(self, topic_names, monitored, get_bandwidth, now):
+        """
+        @param topic_names: names of all known topics
+        @param monitored: set of the names of the currently monitored topics
+        @param get_bandwidth: function returning the bandwidth of a monitored
+                              topic in bytes per second or None
+        @param now: current time in seconds
+        @return: (topic names to start monitoring, topic names to stop monitoring),
+                 record_sample() should be called for the latter before stopping them
+        """
+        start = []
+        stop = []
+        matching = set(topic_name for topic_name in topic_names if self.matches(topic_name))
+        for topic_name in list(self._topics):
+            if topic_name not in matching:
+                if self._topics.pop(topic_name).started is not None:
+                    stop.append(topic_name)
+        for topic_name in matching:
+            if topic_name not in self._topics:
+                self._topics[topic_name] = _ScheduledTopic()
+
+        active = []
+        waiting = []
+        for topic_name, topic in self._topics.items():
+            if topic.started is not None:
+                if topic_name in monitored:
+                    bandwidth = get_bandwidth(topic_name)
+                    if bandwidth is not None:
+                        topic.bandwidth = bandwidth
+                    active.append(topic_name)
+                else:
+                    # stopped by other means
+                    topic.started = None
+                    topic.stopped = now
+            elif topic_name not in monitored:
+                waiting.append(topic_name)
+
+        def stop_topic(topic_name):
+            topic = self._topics[topic_name]
+            topic.started = None
+            topic.stopped = now
+            active.remove(topic_name)
+            stop.append(topic_name)
+
+        # topics which had their turn make room for the waiting ones
+        if waiting:
+            expired = [
+                topic_name for topic_name in active
+                if now - self._topics[topic_name].started >= self.dwell_time]
+            expired.sort(key=lambda topic_name: self._topics[topic_name].started)
+            for topic_name in expired[:len(waiting)]:
+                stop_topic(topic_name)
+
+        # shed the most expensive topics while the bandwidth exceeds the budget
+        total_bandwidth = sum(self._topics[topic_name].bandwidth or 0 for topic_name in active)
+        if self.max_bandwidth:
+            for topic_name in sorted(
+                    active, key=lambda topic_name: -(self._topics[topic_name].bandwidth or 0)):
+                if total_bandwidth <= self.max_bandwidth or len(active) <= 1:
+                    break
+                total_bandwidth -= self._topics[topic_name].bandwidth or 0
+                stop_topic(topic_name)
+
+        # give free slots to the topics which have never been sampled or waited longest
+        waiting.sort(key=lambda topic_name: (
+            self._topics[topic_name].stopped is not None, self._topics[topic_name].stopped))
+        for topic_name in waiting:
+            if len(active) >= self.max_subscriptions:
+                break
+            topic = self._topics[topic_name]
+            # the bandwidth of topics not sampled yet is unknown
+            bandwidth = topic.bandwidth or 0
+            if self.max_bandwidth and active and \
+                    total_bandwidth + bandwidth > self.max_bandwidth:
+                continue
+            topic.started = now
+            total_bandwidth += bandwidth
+            active.append(topic_name)
+            start.append(topic_name)
+        return start, stop
+
+    def record_sample(self, topic_name, sample, now):
+        """
+        @param sample: statistics of the topic before it stops being monitored
+        """
+        topic = self._topics.get(topic_name)
+        if topic is not None:
+            topic.sample = sample
+            topic.sample_time = now
+
+    def get_sample(self, topic_name, now):
+        """
+        @return: (sample, age in seconds) of a scheduled topic currently not
+                 monitored, (None, None) if it has not been sampled yet
+        """
+        topic = self._topics.get(topic_name)
+        if topic is None or topic.sample is None:
+            return None, None
+        return topic.sample, now - topic.sample_time
+
+
+class _ScheduledTopic(object):
+
+    __slots__ = ('started', 'stopped', 'bandwidth', 'sample', 'sample_time')
+
+    def __init__(self):
+        self.started = None
+        self.stopped = None
+        self.bandwidth = None
+        self.sample = None
+        self.sample_time = None
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2011, Dorian Scholz, TU Darmstadt
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#   * Neither the name of the TU Darmstadt nor the names of its
+#     contributors may be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+from collections import OrderedDict
+
+# monotonic high resolution clock used for all durations and deadlines
+try:
+    from time import perf_counter as clock
+except ImportError:
+    from time import time as clock
+
+try:
+    # CPU time of the calling thread, without the time spent waiting for the GIL
+    from time import thread_time as thread_clock
+except ImportError:
+    # Python 2 has no per-thread CPU clock, fall back to wall time
+    thread_clock = clock
+
+
+class PhaseTimer(object):
+
+    """
+    Accumulates the time spent in named phases of a repeated task.
+
+    Starting a phase ends the current one, so a loop can switch between phases
+    without nesting. The durations are in seconds and keep the order in which
+    the phases were started first.
+    """
+
+    def __init__(self):
+        super(PhaseTimer, self).__init__()
+        self.durations = OrderedDict()
+        self._phase = None
+        self._start_time = None
+
+    def start(self, phase):
+        now = clock()
+        if self._phase is not None:
+            self.durations[self._phase] += now - self._start_time
+        self.durations.setdefault(phase, 0.)
+        self._phase = phase
+        self._start_time = now
+
+    def stop(self):
+        if self._phase is not None:
+            self.durations[self._phase] += clock() - self._start_time
+            self._phase = None
+
+    def reset(self):
+        self.durations = OrderedDict()
+        self._phase = None
+
+    def total(self):
+        return sum(self.durations.values())
+
+    def format(self):
+        """
+        @return: text like 'total 5.1 ms (phase 1.0, other 4.1)'
+        """
+        return 'total %.1f ms (%s)' % (self.total() * 1000., ', '.join(
+            '%s %.1f' % (phase, duration * 1000.)
+            for phase, duration in self.durations.items()))
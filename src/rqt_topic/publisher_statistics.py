@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2011, Dorian Scholz, TU Darmstadt
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#   * Neither the name of the TU Darmstadt nor the names of its
+#     contributors may be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+from __future__ import division
+
+from .rate_history import RateHistory
+
+
+class PublisherStatistics(object):
+
+    """
+    Counters of the messages received from one publisher of a topic.
+
+    Each connection is served by its own receive thread, so the counters of a
+    publisher are only written by one thread and are updated without a lock.
+
+    Messages are counted as dropped for each gap in their header.seq and as
+    reordered if their seq is lower than expected, which also takes back one
+    of the drops. A publisher which does not set seq is not checked. Gaps
+    between connections, i.e. while the topic is subscribed again, are not
+    counted.
+    """
+
+    # seconds the rate and bandwidth are computed over
+    HISTORY_DURATION = 10.
+    # a seq going back further than this is taken as a restart of the publisher
+    MAX_REORDER = 1000
+
+    __slots__ = (
+        'callerid', 'message_count', 'dropped', 'reordered', 'numbered', 'last_time',
+        '_last_seq', '_connection', '_history')
+
+    def __init__(self, callerid):
+        """
+        @param callerid: name of the publishing node from the connection header
+        """
+        super(PublisherStatistics, self).__init__()
+        self.callerid = callerid
+        self.message_count = 0
+        self.dropped = 0
+        self.reordered = 0
+        # whether the seq of the messages changed, many publishers leave it at 0
+        self.numbered = False
+        # receipt time of the latest message in seconds
+        self.last_time = None
+        self._last_seq = None
+        self._connection = None
+        self._history = RateHistory(self.HISTORY_DURATION, 1.)
+
+    def add(self, size, time, seq=None, connection=None):
+        """
+        @param size: size of the message in bytes
+        @param time: receipt time in seconds
+        @param seq: header.seq of the message, None for messages without header
+        @param connection: connection header of the message, rospy creates one per connection
+        """
+        self.message_count += 1
+        self.last_time = time
+        self._history.add(size, time)
+        if connection is not self._connection:
+            # messages published while not connected are not drops
+            self._connection = connection
+            self._last_seq = None
+        if seq is None or seq == self._last_seq:
+            return
+        if self._last_seq is None:
+            self._last_seq = seq
+            return
+        self.numbered = True
+        gap = (seq - self._last_seq) & 0xffffffff
+        if gap < 0x80000000:
+            self.dropped += gap - 1
+            self._last_seq = seq
+        elif 0x100000000 - gap <= self.MAX_REORDER:
+            self.reordered += 1
+            if self.dropped:
+                self.dropped -= 1
+        else:
+            self._last_seq = seq
+
+    def get_rate(self, time):
+        """
+        @return: messages per second over the last HISTORY_DURATION seconds or None
+        """
+        return _mean(self._history.get_rates(time))
+
+    def get_bandwidth(self, time):
+        """
+        @return: bytes per second over the last HISTORY_DURATION seconds or None
+        """
+        return _mean(self._history.get_bandwidths(time))
+
+
+def _mean(values):
+    known_values = [value for value in values if value is not None]
+    if not known_values:
+        return None
+    return sum(known_values) / len(known_values)
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2011, Dorian Scholz, TU Darmstadt
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#   * Neither the name of the TU Darmstadt nor the names of its
+#     contributors may be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+from __future__ import division
+from array import array
+import copy
+
+
+class RateHistory(object):
+
+    """
+    Number of messages and bytes received per time slot over a fixed duration.
+
+    Unlike the statistics over the last messages, slots without messages show
+    dropouts as a rate of zero. The slots are stored in two preallocated arrays
+    which are allocated with the first message, so the memory per topic is
+    bounded by the number of slots.
+    """
+
+    def __init__(self, duration=300., slot_duration=1.):
+        """
+        @param duration: seconds of history kept
+        @param slot_duration: seconds per slot
+        """
+        super(RateHistory, self).__init__()
+        self._slot_duration = slot_duration
+        self._slot_count = max(2, int(round(duration / slot_duration)))
+        self._counts = None
+        self._sizes = None
+        self.clear()
+
+    def clear(self):
+        if self._counts is not None:
+            self._counts = array('L', [0]) * self._slot_count
+            self._sizes = array('d', [0.]) * self._slot_count
+        # absolute numbers of the first and the latest slot with data
+        self._first_slot = None
+        self._last_slot = None
+
+    def copy(self):
+        """
+        Copy the slots, so the rates can be read from the copy while messages
+        are added to the original.
+
+        @return: RateHistory
+        """
+        history = copy.copy(self)
+        if self._counts is not None:
+            history._counts = self._counts[:]
+            history._sizes = self._sizes[:]
+        return history
+
+    def add(self, size, time):
+        """
+        @param size: size of the received message in bytes
+        @param time: receipt time in seconds
+        """
+        slot = int(time // self._slot_duration)
+        if self._counts is None:
+            self._counts = array('L', [0]) * self._slot_count
+            self._sizes = array('d', [0.]) * self._slot_count
+        if self._last_slot is None or slot < self._last_slot:
+            # first message or time reset
+            self.clear()
+            self._first_slot = self._last_slot = slot
+        elif slot > self._last_slot:
+            # clear the slots reused since the latest message
+            for skipped in range(
+                    self._last_slot + 1, min(slot, self._last_slot + self._slot_count) + 1):
+                index = skipped % self._slot_count
+                self._counts[index] = 0
+                self._sizes[index] = 0.
+            self._last_slot = slot
+        index = slot % self._slot_count
+        self._counts[index] += 1
+        self._sizes[index] += size
+
+    def get_rates(self, time):
+        """
+        @param time: current time in seconds
+        @return: list of the messages per second of the complete slots up to
+                 time, oldest first, with None for slots before the first message
+        """
+        return self._get_values(self._counts, time)
+
+    def get_bandwidths(self, time):
+        """
+        @param time: current time in seconds
+        @return: list of the bytes per second of the complete slots up to
+                 time, oldest first, with None for slots before the first message
+        """
+        return self._get_values(self._sizes, time)
+
+    def _get_values(self, slots, time):
+        # the current slot is not complete yet
+        last = int(time // self._slot_duration) - 1
+        first = max(last, self._last_slot) - self._slot_count + 1 \
+            if self._last_slot is not None else last + 1
+        values = []
+        for slot in range(first, last + 1):
+            if self._first_slot is None or slot < self._first_slot:
+                values.append(None)
+            elif slot > self._last_slot:
+                values.append(0.)
+            else:
+                values.append(slots[slot % self._slot_count] / self._slot_duration)
+        return values
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2011, Dorian Scholz, TU Darmstadt
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#   * Neither the name of the TU Darmstadt nor the names of its
+#     contributors may be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+from array import array
+from collections import deque
+
+
+class RingBuffer(object):
+
+    """
+    Fixed capacity buffer of numbers with constant time append, sum, min and max.
+
+    Once the buffer is full appending a value drops the oldest one. The values are
+    stored in a preallocated array, min and max are tracked with monotonic deques.
+    """
+
+    def __init__(self, capacity, typecode='d'):
+        """
+        @param capacity: maximum number of values kept
+        @param typecode: typecode of the underlying array, i.e. 'd' or 'L'
+        """
+        if capacity < 1:
+            raise ValueError('capacity must be at least 1')
+        self._capacity = capacity
+        self._values = array(typecode, [0]) * capacity
+        self._exact_sum = typecode not in ('f', 'd')
+        self.clear()
+
+    def clear(self):
+        self._start = 0
+        self._count = 0
+        self._position = 0
+        self._sum = 0
+        # (position, value) pairs with increasing respectively decreasing values
+        self._min = deque()
+        self._max = deque()
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    def append(self, value):
+        if self._count == self._capacity:
+            self._sum -= self._values[self._start]
+            self._values[self._start] = value
+            self._start += 1
+            if self._start == self._capacity:
+                self._start = 0
+                if not self._exact_sum:
+                    # recompute once per cycle to avoid accumulating rounding errors
+                    self._sum = sum(self._values) - value
+        else:
+            index = self._start + self._count
+            if index >= self._capacity:
+                index -= self._capacity
+            self._values[index] = value
+            self._count += 1
+        self._sum += value
+
+        position = self._position
+        self._position += 1
+        expired = position - self._capacity
+        while self._min and self._min[-1][1] >= value:
+            self._min.pop()
+        self._min.append((position, value))
+        if self._min[0][0] <= expired:
+            self._min.popleft()
+        while self._max and self._max[-1][1] <= value:
+            self._max.pop()
+        self._max.append((position, value))
+        if self._max[0][0] <= expired:
+            self._max.popleft()
+
+    def sum(self):
+        return self._sum
+
+    def min(self):
+        if not self._count:
+            raise ValueError('min() of empty ring buffer')
+        return self._min[0][1]
+
+    def max(self):
+        if not self._count:
+            raise ValueError('max() of empty ring buffer')
+        return self._max[0][1]
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError('ring buffer index out of range')
+        index += self._start
+        if index >= self._capacity:
+            index -= self._capacity
+        return self._values[index]
+
+    def __iter__(self):
+        for index in range(self._count):
+            yield self[index]
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2011, Dorian Scholz, TU Darmstadt
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#   * Neither the name of the TU Darmstadt nor the names of its
+#     contributors may be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+from __future__ import division
+
+from python_qt_binding.QtCore import QLineF, QSize
+from python_qt_binding.QtWidgets import QStyledItemDelegate
+
+
+class SparklineDelegate(QStyledItemDelegate):
+
+    """
+    Draws the text of a cell followed by a sparkline of a history of values.
+
+    The values are drawn as bars scaled to the peak of the history, each bar
+    showing the maximum of the values it covers so short bursts stay visible.
+    The history is fetched only when a cell is painted, i.e. for visible rows.
+    """
+
+    # width in pixels of the sparkline next to the text
+    WIDTH = 80
+    MARGIN = 4
+
+    def __init__(self, get_values, parent=None):
+        """
+        @param get_values: function returning the list of values of a QModelIndex,
+                           oldest first and None for unknown values, or None
+                           if the cell has no history
+        """
+        super(SparklineDelegate, self).__init__(parent)
+        self._get_values = get_values
+        self.enabled = True
+
+    def sizeHint(self, option, index):
+        size = super(SparklineDelegate, self).sizeHint(option, index)
+        if self.enabled:
+            size = QSize(size.width() + self.WIDTH + self.MARGIN, size.height())
+        return size
+
+    def paint(self, painter, option, index):
+        super(SparklineDelegate, self).paint(painter, option, index)
+        if not self.enabled:
+            return
+        values = self._get_values(index)
+        known_values = [value for value in values or () if value is not None]
+        if not known_values:
+            return
+        peak = max(known_values)
+        rect = option.rect
+        width = min(self.WIDTH, rect.width() // 2)
+        height = rect.height() - 4
+        if width < 2 or height < 2:
+            return
+        left = rect.right() - self.MARGIN - width
+        bottom = rect.bottom() - 2
+
+        count = len(values)
+        bars = []
+        first_x = None
+        for x in range(width):
+            start = x * count // width
+            bucket = [
+                value for value in values[start:max(start + 1, (x + 1) * count // width)]
+                if value is not None]
+            if not bucket:
+                continue
+            if first_x is None:
+                first_x = left + x
+            value = max(bucket)
+            if value > 0 and peak > 0:
+                bars.append(QLineF(
+                    left + x, bottom, left + x, bottom - max(1., value / peak * height)))
+
+        color = option.palette.highlight().color()
+        painter.save()
+        # the baseline distinguishes dropouts from the time before the first message
+        color.setAlpha(96)
+        painter.setPen(color)
+        painter.drawLine(QLineF(first_x, bottom, left + width - 1, bottom))
+        color.setAlpha(192)
+        painter.setPen(color)
+        painter.drawLines(bars)
+        painter.restore()
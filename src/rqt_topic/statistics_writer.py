@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2011, Dorian Scholz, TU Darmstadt
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#   * Neither the name of the TU Darmstadt nor the names of its
+#     contributors may be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+from collections import OrderedDict
+import json
+import os
+import threading
+
+try:
+    from queue import Empty, Full, Queue
+except ImportError:
+    from Queue import Empty, Full, Queue
+
+import rospy
+
+from .profiling import clock
+
+# fields of a statistics sample in the order of the CSV columns
+STATISTICS_FIELDS = [
+    'stamp', 'topic', 'type', 'hz', 'min_dt', 'max_dt', 'bw', 'size', 'min_size', 'max_size',
+    'latency', 'overflow']
+
+
+def get_topic_statistics(topic_name, topic_type, topic_info, stamp=None):
+    """
+    @param topic_info: TopicInfo of the topic
+    @param stamp: time of the sample, defaults to the current ROS time
+    @return: OrderedDict with the STATISTICS_FIELDS of the topic
+    """
+    rate, _, min_delta, max_delta = topic_info.get_hz()
+    bytes_per_s, mean_size, min_size, max_size = topic_info.get_bw()
+    latency, _, _ = topic_info.get_latency()
+    return OrderedDict(zip(STATISTICS_FIELDS, [
+        rospy.get_time() if stamp is None else stamp, topic_name, topic_type,
+        rate, min_delta, max_delta, bytes_per_s, mean_size, min_size, max_size, latency,
+        topic_info.get_overflow()]))
+
+
+class StatisticsWriter(object):
+
+    """
+    Appends statistics samples to a CSV or JSON lines file in a background thread.
+
+    Samples are queued without blocking the caller and written in bulk once
+    per flush interval. When the file exceeds max_bytes it is rotated like
+    logging.handlers.RotatingFileHandler does, keeping backup_count old files
+    named path.1, path.2, ...
+    """
+
+    # seconds close() waits for the queued samples to be written
+    CLOSE_TIMEOUT = 2.0
+
+    def __init__(self, path, output_format=None, max_bytes=64 * 1024 * 1024, backup_count=5,
+                 flush_interval=1.0, max_queued=1000):
+        """
+        @param output_format: either 'csv' or 'json', guessed from the file extension if None
+        @param max_queued: number of pending write() calls after which samples are dropped
+        """
+        super(StatisticsWriter, self).__init__()
+        if output_format is None:
+            output_format = 'csv' if path.lower().endswith('.csv') else 'json'
+        self.path = path
+        self._output_format = output_format
+        self._max_bytes = max_bytes
+        self._backup_count = backup_count
+        self._flush_interval = flush_interval
+        # number of samples dropped because the writer could not keep up
+        self.dropped = 0
+        self.error = None
+        self._queue = Queue(max_queued)
+        # set by close(), the thread stops once the queue is drained
+        self._closed = threading.Event()
+        self._file = None
+        self._file_size = 0
+        self._thread = threading.Thread(target=self._run, name='rqt_topic statistics writer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def write(self, samples):
+        """
+        Queue samples for writing without blocking.
+
+        @param samples: list of dicts with the STATISTICS_FIELDS
+        """
+        if not samples:
+            return
+        try:
+            self._queue.put_nowait(samples)
+        except Full:
+            self.dropped += len(samples)
+
+    def close(self, timeout=CLOSE_TIMEOUT):
+        """
+        Write all queued samples and stop the writer thread.
+
+        @param timeout: seconds to wait for the writer thread, it keeps writing
+                        in the background if it does not finish in time
+        """
+        self._closed.set()
+        try:
+            # wakes up the thread, if the queue is full it stops once it is drained
+            self._queue.put_nowait(None)
+        except Full:
+            pass
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            rospy.logwarn(
+                'rqt_topic: Writing the statistics to "%s" did not finish within %.1f s, '
+                'queued samples may be lost' % (self.path, timeout))
+
+    def _run(self):
+        lines = []
+        next_flush = clock() + self._flush_interval
+        while True:
+            try:
+                samples = self._queue.get(timeout=self._flush_interval)
+            except Empty:
+                samples = ()
+            if samples is None:
+                break
+            lines.extend(self._format(sample) for sample in samples)
+            if self._closed.is_set() and self._queue.empty():
+                break
+            if lines and clock() >= next_flush:
+                self._flush(lines)
+                lines = []
+                next_flush = clock() + self._flush_interval
+        self._flush(lines)
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _format(self, sample):
+        if self._output_format == 'json':
+            return json.dumps(sample) + '\n'
+        # topic names and types never contain characters which need quoting
+        return ','.join(
+            '' if sample.get(field) is None else str(sample[field])
+            for field in STATISTICS_FIELDS) + '\n'
+
+    def _flush(self, lines):
+        if not lines or self.error is not None:
+            return
+        text = ''.join(lines)
+        try:
+            if self._file is not None and self._file_size + len(text) > self._max_bytes:
+                self._rotate()
+            if self._file is None:
+                self._open()
+            self._file.write(text)
+            self._file.flush()
+            self._file_size += len(text)
+        except (IOError, OSError) as e:
+            # stop writing instead of reporting the same error every flush
+            self.error = str(e)
+            rospy.logerr('rqt_topic: Failed to write statistics to "%s": %s' % (self.path, e))
+
+    def _open(self):
+        self._file = open(self.path, 'a')
+        self._file_size = self._file.tell()
+        if self._output_format == 'csv' and not self._file_size:
+            header = ','.join(STATISTICS_FIELDS) + '\n'
+            self._file.write(header)
+            self._file_size += len(header)
+
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+        if self._backup_count <= 0:
+            os.remove(self.path)
+            return
+        for index in range(self._backup_count - 1, 0, -1):
+            source = '%s.%d' % (self.path, index)
+            if os.path.exists(source):
+                target = '%s.%d' % (self.path, index + 1)
+                if os.path.exists(target):
+                    os.remove(target)
+                os.rename(source, target)
+        target = self.path + '.1'
+        if os.path.exists(target):
+            os.remove(target)
+        os.rename(self.path, target)
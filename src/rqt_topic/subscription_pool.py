@@ -0,0 +1,438 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2011, Dorian Scholz, TU Darmstadt
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#   * Neither the name of the TU Darmstadt nor the names of its
+#     contributors may be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import threading
+
+import rospy
+
+from .profiling import clock
+
+
+class SubscriptionPool(object):
+
+    """
+    Shares one subscriber per topic and message class between all callbacks.
+
+    Each topic is subscribed once no matter how many TopicInfo instances, also
+    of different plugin instances, monitor it. The subscriber is unregistered
+    when the last callback is removed.
+
+    The subscribers use a bounded queue, so a process falling behind drops
+    messages instead of lagging, and a receive buffer which grows with the
+    messages observed on the topic. Messages dropped because the queue
+    overflowed are counted, see PooledSubscriber.get_overflow().
+
+    Growing the receive buffer needs new connections. The topic is subscribed
+    again in a background thread, since that talks to the master, and at most
+    once per RESIZE_INTERVAL. Changing the queue size subscribes all topics
+    again in the same thread.
+    """
+
+    DEFAULT_QUEUE_SIZE = 10
+    # rospy.Subscriber default
+    DEFAULT_BUFF_SIZE = 65536
+    MAX_BUFF_SIZE = 64 * 1024 * 1024
+    # minimum seconds between subscribing to a topic again for a larger buffer
+    RESIZE_INTERVAL = 10.
+
+    def __init__(self, queue_size=DEFAULT_QUEUE_SIZE):
+        """
+        @param queue_size: number of messages queued per connection, None for no limit
+        """
+        super(SubscriptionPool, self).__init__()
+        self._lock = threading.Lock()
+        self._queue_size = queue_size
+        # (topic name, data class) -> _SharedSubscription
+        self._subscriptions = {}
+        # topic name -> receive buffer size, kept after unsubscribing
+        self._buff_sizes = {}
+        # (topic name, data class) -> requested buffer size, guarded by the condition
+        # instead of the lock so requests never wait for a resubscription
+        self._resize_condition = threading.Condition()
+        self._resize_requests = {}
+        # keys of the subscriptions to subscribe again with the current queue size
+        self._requeue_requests = set()
+        # topic name -> time of the last resubscription for a larger buffer
+        self._resize_times = {}
+        self._resize_thread = None
+
+    def subscribe(self, topic_name, data_class, callback):
+        """
+        @param callback: function called with each received message
+        @return: PooledSubscriber whose unregister() removes the callback again
+        """
+        key = (topic_name, data_class)
+        with self._lock:
+            subscription = self._subscriptions.get(key)
+            if subscription is None:
+                subscription = _SharedSubscription(
+                    topic_name, data_class, self._queue_size,
+                    self._buff_sizes.get(topic_name, self.DEFAULT_BUFF_SIZE))
+                self._subscriptions[key] = subscription
+            subscription.add_callback(callback)
+        return PooledSubscriber(self, key, callback, subscription.get_overflow())
+
+    def subscription_count(self):
+        """
+        @return: number of subscribers of this pool
+        """
+        with self._lock:
+            return len(self._subscriptions)
+
+    def queue_size(self):
+        return self._queue_size
+
+    def set_queue_size(self, queue_size):
+        """
+        Change the queue size of all subscribers of the process. They are
+        subscribed again in the background, this returns right away.
+
+        @param queue_size: number of messages queued per connection, None for no limit
+        """
+        with self._lock:
+            if queue_size == self._queue_size:
+                return
+            self._queue_size = queue_size
+            keys = list(self._subscriptions.keys())
+        with self._resize_condition:
+            self._requeue_requests.update(keys)
+            self._notify_resize_thread()
+
+    def _unsubscribe(self, key, callback):
+        with self._lock:
+            subscription = self._subscriptions.get(key)
+            if subscription is None:
+                return
+            subscription.remove_callback(callback)
+            if subscription.callbacks:
+                return
+            del self._subscriptions[key]
+        subscription.unregister()
+
+    def _get_overflow(self, key):
+        subscription = self._subscriptions.get(key)
+        return subscription.get_overflow() if subscription is not None else None
+
+    def _get_queue_depth(self, key):
+        subscription = self._subscriptions.get(key)
+        return subscription.get_queue_depth() if subscription is not None else None
+
+    def _fit_buff_size(self, key, message_size):
+        subscription = self._subscriptions.get(key)
+        if subscription is None or message_size <= subscription.buff_size:
+            return
+        # grow in powers of two to resubscribe rarely
+        buff_size = subscription.buff_size
+        while buff_size < message_size and buff_size < self.MAX_BUFF_SIZE:
+            buff_size *= 2
+        if buff_size == subscription.buff_size:
+            return
+        with self._resize_condition:
+            if self._resize_requests.get(key, 0) >= buff_size:
+                return
+            self._resize_requests[key] = buff_size
+            self._notify_resize_thread()
+
+    def _notify_resize_thread(self):
+        # the condition is held
+        if self._resize_thread is None:
+            self._resize_thread = threading.Thread(
+                target=self._run_resizes, name='rqt_topic subscription resizer')
+            self._resize_thread.daemon = True
+            self._resize_thread.start()
+        self._resize_condition.notify()
+
+    def _run_resizes(self):
+        while True:
+            with self._resize_condition:
+                key, buff_size = self._wait_for_resize()
+            if buff_size is None:
+                self._requeue(key)
+            else:
+                self._resize(key, buff_size)
+
+    def _wait_for_resize(self):
+        # the condition is held, returns the next request which is due,
+        # queue size changes are not rate limited and have no buffer size
+        while True:
+            if self._requeue_requests:
+                return self._requeue_requests.pop(), None
+            now = clock()
+            next_time = None
+            for key in self._resize_requests:
+                resize_time = self._resize_times.get(key[0], now - self.RESIZE_INTERVAL) + \
+                    self.RESIZE_INTERVAL
+                if resize_time <= now:
+                    return key, self._resize_requests.pop(key)
+                next_time = resize_time if next_time is None else min(next_time, resize_time)
+            self._resize_condition.wait(None if next_time is None else next_time - now)
+
+    def _resize(self, key, buff_size):
+        with self._lock:
+            subscription = self._subscriptions.get(key)
+            if subscription is None or buff_size <= subscription.buff_size:
+                return
+            self._buff_sizes[key[0]] = buff_size
+            queue_size = self._queue_size
+        if subscription.is_shared():
+            # the connections are kept open by the other subscriber, so the new
+            # buffer size would only apply to connections of new publishers
+            rospy.logdebug(
+                'rqt_topic: not resizing the receive buffer of "%s", the subscription '
+                'is shared with another subscriber' % key[0])
+            return
+        self._resize_times[key[0]] = clock()
+        subscription.resubscribe(queue_size, buff_size)
+
+    def _requeue(self, key):
+        with self._lock:
+            subscription = self._subscriptions.get(key)
+            if subscription is None:
+                return
+            queue_size = self._queue_size
+        subscription.resubscribe(queue_size, subscription.buff_size)
+
+
+class PooledSubscriber(object):
+
+    """
+    Handle of a callback registered with a SubscriptionPool.
+    """
+
+    def __init__(self, pool, key, callback, overflow):
+        super(PooledSubscriber, self).__init__()
+        self.name = key[0]
+        self.data_class = key[1]
+        self._pool = pool
+        self._key = key
+        self._callback = callback
+        # overflow of the shared subscription before this callback was added
+        self._overflow = overflow
+
+    def unregister(self):
+        if self._pool is not None:
+            self._pool._unsubscribe(self._key, self._callback)
+            self._pool = None
+
+    def get_overflow(self):
+        """
+        @return: number of messages received since subscribing which were
+                 dropped because the queue overflowed, None if unknown
+        """
+        if self._pool is None:
+            return None
+        overflow = self._pool._get_overflow(self._key)
+        if overflow is None or self._overflow is None:
+            return overflow
+        return max(0, overflow - self._overflow)
+
+    def get_queue_depth(self):
+        """
+        @return: number of received messages waiting in the queue, None if unknown
+        """
+        if self._pool is None:
+            return None
+        return self._pool._get_queue_depth(self._key)
+
+    def fit_buff_size(self, message_size):
+        """
+        Grow the receive buffer if it is smaller than a message. The topic is
+        subscribed again in the background, this returns right away.
+
+        @param message_size: size of the largest message in bytes
+        """
+        if self._pool is not None:
+            self._pool._fit_buff_size(self._key, message_size)
+
+
+class _SharedSubscription(object):
+
+    def __init__(self, topic_name, data_class, queue_size, buff_size):
+        super(_SharedSubscription, self).__init__()
+        # replaced instead of modified so the receive thread can iterate without locking
+        self.callbacks = ()
+        self.topic_name = topic_name
+        self.buff_size = buff_size
+        # rospy drops the oldest messages of an overflowing queue after deserializing
+        # them, so the messages deserialized before a dispatched one but not
+        # dispatched overflowed. Each connection has its own queue and receive
+        # thread, which deserializes and dispatches its messages, so they are
+        # counted per receive thread without a lock.
+        self._local = threading.local()
+        self._connections_lock = threading.Lock()
+        self._connections = []
+        # overflow of the connections which are closed
+        self._closed_overflow = 0
+        self._counting = True
+        # serializes resubscribing in the background with unregistering
+        self._subscriber_lock = threading.Lock()
+        self._unregistered = False
+        self._data_class = self._create_counting_class(data_class)
+        self._subscriber = self._subscribe(queue_size)
+
+    def _create_counting_class(self, data_class):
+        subscription = self
+        base_deserialize = data_class.deserialize
+
+        def deserialize(message, buff):
+            counters = getattr(subscription._local, 'counters', None)
+            if counters is None:
+                counters = subscription._add_connection()
+            counters.deserialized += 1
+            message.__dict__['_deserialized_number'] = counters.deserialized
+            return base_deserialize(message, buff)
+
+        return type(data_class.__name__, (data_class,), {'deserialize': deserialize})
+
+    def _add_connection(self):
+        counters = _ConnectionCounters()
+        self._local.counters = counters
+        with self._connections_lock:
+            self._connections.append(counters)
+        return counters
+
+    def _get_connections(self):
+        """
+        @return: list of the _ConnectionCounters of the open connections
+        """
+        with self._connections_lock:
+            closed = [
+                counters for counters in self._connections if not counters.thread.is_alive()]
+            if closed:
+                self._closed_overflow += sum(counters.overflow for counters in closed)
+                self._connections = [
+                    counters for counters in self._connections if counters.thread.is_alive()]
+            return list(self._connections)
+
+    def _subscribe(self, queue_size):
+        return rospy.Subscriber(
+            self.topic_name, self._data_class, self._dispatch, queue_size=queue_size,
+            buff_size=self.buff_size)
+
+    def resubscribe(self, queue_size, buff_size):
+        # new connections are needed to apply the queue and buffer size
+        with self._subscriber_lock:
+            if self._unregistered:
+                return
+            self._subscriber.unregister()
+            self.buff_size = buff_size
+            self._subscriber = self._subscribe(queue_size)
+
+    def is_shared(self):
+        """
+        @return: whether another rospy.Subscriber of this process uses the same
+                 connections, which are then not closed by unregistering
+        """
+        impl = getattr(self._subscriber, 'impl', None)
+        return getattr(impl, 'ref_count', 1) > 1
+
+    def add_callback(self, callback):
+        self.callbacks = self.callbacks + (callback,)
+
+    def remove_callback(self, callback):
+        callbacks = list(self.callbacks)
+        callbacks.remove(callback)
+        self.callbacks = tuple(callbacks)
+
+    def unregister(self):
+        with self._subscriber_lock:
+            self._unregistered = True
+            self._subscriber.unregister()
+
+    def get_overflow(self):
+        """
+        @return: number of messages dropped because the queue overflowed, None
+                 if the messages are not deserialized by this subscription
+        """
+        if not self._counting:
+            return None
+        connections = self._get_connections()
+        return self._closed_overflow + sum(counters.overflow for counters in connections)
+
+    def get_queue_depth(self):
+        """
+        @return: number of deserialized messages neither dispatched nor dropped
+                 yet, None if the messages are not deserialized by this subscription
+        """
+        if not self._counting:
+            return None
+        return sum(
+            max(0, counters.deserialized - counters.last_dispatched)
+            for counters in self._get_connections())
+
+    def _dispatch(self, message):
+        if isinstance(message, self._data_class):
+            # deserialized by this receive thread
+            counters = self._local.counters
+            number = message.__dict__['_deserialized_number']
+            counters.dispatched += 1
+            counters.overflow = max(0, number - counters.dispatched)
+            counters.last_dispatched = number
+        else:
+            # another subscriber of the topic in this process deserializes the messages
+            self._counting = False
+        for callback in self.callbacks:
+            try:
+                callback(message)
+            except Exception as e:
+                # like rospy, do not let one failing callback affect the others
+                rospy.logerr('rqt_topic: Error in callback for topic "%s": %s' % (
+                    self.topic_name, e))
+
+
+class _ConnectionCounters(object):
+
+    """
+    Numbers of the messages of one connection, written by its receive thread.
+    """
+
+    __slots__ = ('thread', 'deserialized', 'dispatched', 'last_dispatched', 'overflow')
+
+    def __init__(self):
+        super(_ConnectionCounters, self).__init__()
+        self.thread = threading.current_thread()
+        # number of the last deserialized message, counting from one
+        self.deserialized = 0
+        self.dispatched = 0
+        # number of the last dispatched message
+        self.last_dispatched = 0
+        self.overflow = 0
+
+
+_subscription_pool = SubscriptionPool()
+
+
+def get_subscription_pool():
+    """
+    @return: SubscriptionPool shared by the whole process
+    """
+    return _subscription_pool
@@ -30,6 +30,8 @@
 # ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
+import argparse
+
 from rqt_gui_py.plugin import Plugin
 
 from .topic_widget import TopicWidget
@@ -41,7 +43,18 @@ class Topic(Plugin):
         super(Topic, self).__init__(context)
         self.setObjectName('Topic')
 
-        self._widget = TopicWidget(self)
+        args = self._parse_args(context.argv())
+        if args.headless:
+            # only the rqt_topic script runs without a GUI, see scripts/rqt_topic
+            raise RuntimeError(
+                'Topic.__init__(): --headless is only supported when running the '
+                'rqt_topic script, not when loading the plugin in rqt')
+        if args.model_view:
+            # only imported when used to keep the startup of the default view short
+            from .topic_model_widget import TopicModelWidget
+            self._widget = TopicModelWidget(self)
+        else:
+            self._widget = TopicWidget(self)
 
         self._widget.start()
         if context.serial_number() > 1:
@@ -49,9 +62,28 @@ class Topic(Plugin):
                 self._widget.windowTitle() + (' (%d)' % context.serial_number()))
         context.add_widget(self._widget)
 
+    def _parse_args(self, argv):
+        parser = argparse.ArgumentParser(prog='rqt_topic', add_help=False)
+        Topic.add_arguments(parser)
+        return parser.parse_args(argv)
+
+    @staticmethod
+    def add_arguments(parser):
+        group = parser.add_argument_group('Options for rqt_topic plugin')
+        group.add_argument(
+            '--model-view', action='store_true',
+            help='Use a model/view backend which scales better to large graphs')
+        group.add_argument(
+            '--headless', action='store_true',
+            help='Print topic statistics to stdout without a GUI, only supported by the '
+                 'rqt_topic script, see "rqt_topic --headless --help"')
+
     def shutdown_plugin(self):
         self._widget.shutdown_plugin()
 
+    def trigger_configuration(self):
+        self._widget.edit_refresh_intervals()
+
     def save_settings(self, plugin_settings, instance_settings):
         self._widget.save_settings(plugin_settings, instance_settings)
 
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2011, Dorian Scholz, TU Darmstadt
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#   * Neither the name of the TU Darmstadt nor the names of its
+#     contributors may be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import threading
+
+from python_qt_binding.QtCore import QObject, Signal
+import rospy
+
+from .profiling import clock
+from .topic_index import get_field_paths, has_field_paths
+from .topic_list import diff_topic_lists, get_published_topics, XmlRpcError
+
+
+class TopicDiscovery(QObject):
+
+    """
+    Queries the master for published topics in a background thread.
+
+    Requests made while a query is in progress are coalesced into a single
+    follow-up query. Changes of the resulting topic list compared to the
+    previously posted one are posted as TopicListDiff through the
+    topics_discovered signal. The duration of every query in seconds, failed
+    or not, is posted afterwards through the query_finished signal.
+
+    The field paths of new topic types are loaded in the background as well,
+    which imports their message classes. The field_paths_loaded signal is
+    emitted afterwards.
+    """
+
+    SELECT_BY_NAME = 0
+    SELECT_BY_MSGTYPE = 1
+
+    topics_discovered = Signal(object)
+    query_finished = Signal(float)
+    field_paths_loaded = Signal()
+
+    def __init__(self, parent=None, timeout=3.0):
+        """
+        @param timeout: timeout of a single master query in seconds
+        """
+        super(TopicDiscovery, self).__init__(parent)
+        self._timeout = timeout
+        self._condition = threading.Condition()
+        self._request = None
+        self._is_shutdown = False
+        self._thread = None
+        # topic name -> type as of the last posted diff
+        self._topics = {}
+        # duration of the last master query in seconds
+        self.last_query_duration = None
+
+    def request_refresh(self, selected_topics=None, select_topic_type=SELECT_BY_NAME):
+        """
+        Schedule a query of the master without blocking the caller.
+
+        @type selected_topics: list of tuples.
+        @param selected_topics: [($NAME_TOPIC$, $TYPE_TOPIC$), ...] or None for all topics
+        @type select_topic_type: int
+        @param select_topic_type: whether to select the topics by name or by type
+        """
+        with self._condition:
+            if self._is_shutdown:
+                return
+            self._request = (selected_topics, select_topic_type)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='rqt_topic discovery')
+                self._thread.daemon = True
+                self._thread.start()
+            self._condition.notify()
+
+    def shutdown(self):
+        with self._condition:
+            self._is_shutdown = True
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._request is None and not self._is_shutdown:
+                    self._condition.wait()
+                if self._is_shutdown:
+                    return
+                selected_topics, select_topic_type = self._request
+                self._request = None
+
+            start_time = clock()
+            topic_diff = None
+            try:
+                topic_list = self._select_topics(selected_topics, select_topic_type)
+            except (IOError, XmlRpcError) as e:
+                rospy.logerr('Communication with rosmaster failed: {0}'.format(e))
+                topic_list = None
+            self.last_query_duration = clock() - start_time
+            if topic_list is not None:
+                topic_diff = self._diff_topics(dict(topic_list))
+            with self._condition:
+                if self._is_shutdown:
+                    return
+                if topic_diff is not None and any(topic_diff):
+                    self.topics_discovered.emit(topic_diff)
+                self.query_finished.emit(self.last_query_duration)
+            if topic_diff is not None and self._load_field_paths(topic_diff):
+                with self._condition:
+                    if self._is_shutdown:
+                        return
+                    self.field_paths_loaded.emit()
+
+    def _load_field_paths(self, topic_diff):
+        """
+        @return: whether the field paths of any type were loaded
+        """
+        loaded = False
+        for _, topic_type in topic_diff.added + topic_diff.retyped:
+            if not has_field_paths(topic_type):
+                get_field_paths(topic_type)
+                loaded = True
+        return loaded
+
+    def _diff_topics(self, topics):
+        topic_diff = diff_topic_lists(self._topics, topics)
+        self._topics = topics
+        return topic_diff
+
+    def _select_topics(self, selected_topics, select_topic_type):
+        if selected_topics is None:
+            topic_list = self._get_published_topics()
+            if not topic_list:
+                rospy.logerr(
+                    'Not even a single published topic found. Check network configuration')
+                return None
+            return topic_list
+
+        # Topics to show are specified.
+        rospy.logdebug('refresh_topics) selected_topics=%s' % (selected_topics,))
+        topic_list = selected_topics
+        if select_topic_type == self.SELECT_BY_MSGTYPE:
+            # The topics that are required (by whoever uses this class).
+            topic_specifiers_required = set(type for name, type in selected_topics)
+
+            # The required topics that match with published topics.
+            topic_list = [(name, type) for name, type in self._get_published_topics()
+                          if type in topic_specifiers_required]
+            rospy.logdebug('selected & published topic types=%s' % (topic_list,))
+
+        if len(topic_list) == 0:
+            rospy.logerr(
+                'None of the following required topics are found.\n(NAME, TYPE): %s' %
+                (selected_topics,))
+            return None
+        return topic_list
+
+    def _get_published_topics(self):
+        return get_published_topics(self._timeout)
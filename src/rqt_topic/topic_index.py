@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2011, Dorian Scholz, TU Darmstadt
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#   * Neither the name of the TU Darmstadt nor the names of its
+#     contributors may be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+from bisect import bisect_left, insort
+import re
+
+from .message_layout import get_message_layout
+
+_TOKEN_SEPARATORS = re.compile('[^0-9a-z]+')
+_ARRAY_INDICES = re.compile(r'\[\d*\]')
+
+# type name -> list of the paths of all fields of the type
+_field_paths = {}
+
+
+def tokenize(text):
+    """
+    @return: list of the lower case tokens of a name, path or query
+    """
+    return [token for token in _TOKEN_SEPARATORS.split(text.lower()) if token]
+
+
+def get_field_paths(type_name):
+    """
+    Return the cached paths of all fields of a message type, i.e. pose/position/x.
+
+    The elements of arrays share the paths of their fields.
+
+    @return: list of paths, empty for primitive and unknown types
+    """
+    try:
+        return _field_paths[type_name]
+    except KeyError:
+        pass
+    paths = []
+    _add_field_paths(paths, '', type_name, set())
+    _field_paths[type_name] = paths
+    return paths
+
+
+def has_field_paths(type_name):
+    """
+    @return: whether the field paths of the type are cached, so get_field_paths()
+             does not have to load any message class
+    """
+    return type_name in _field_paths
+
+
+def _add_field_paths(paths, prefix, type_name, parent_types):
+    layout = get_message_layout(type_name)
+    if layout is None or type_name in parent_types:
+        return
+    parent_types.add(type_name)
+    for field in layout.fields:
+        path = prefix + field.name
+        paths.append(path)
+        _add_field_paths(paths, path + '/', field.base_type_name, parent_types)
+    parent_types.discard(type_name)
+
+
+def normalize_field_path(field_path):
+    """
+    @param field_path: path of a field below a topic, i.e. poses[3]/position
+    @return: the path without array indices as used by the index, i.e. poses/position
+    """
+    return _ARRAY_INDICES.sub('', field_path)
+
+
+class TopicIndex(object):
+
+    """
+    Token index of the topic names and the field paths of their types.
+
+    Names and paths are split into lower case tokens at every character which
+    is neither a letter nor a digit. A topic matches a query if each token of
+    the query is a prefix of a token of its name, a field matches if each
+    token of the query is a prefix of a token of its path or its topic name.
+    The index is updated incrementally as topics come and go and the fields
+    of a type are only indexed once, no matter how many topics share it.
+    Fields are indexed by the first query after their type was added, so
+    adding topics does not load message classes.
+    """
+
+    def __init__(self, load_field_paths=True):
+        """
+        @param load_field_paths: whether a query loads the field paths of new
+                                 types, otherwise their fields are only indexed
+                                 once get_field_paths() was called elsewhere
+        """
+        super(TopicIndex, self).__init__()
+        self._load_field_paths = load_field_paths
+        # topic name -> type name
+        self._topic_types = {}
+        # type name -> set of the names of the topics of the type
+        self._type_topics = {}
+        self._topic_tokens = _TokenIndex()
+        # entries are (type name, field path)
+        self._field_tokens = _TokenIndex()
+        # types whose fields are not indexed yet
+        self._unindexed_types = set()
+
+    def __len__(self):
+        return len(self._topic_types)
+
+    def add_topic(self, topic_name, type_name):
+        if topic_name in self._topic_types:
+            self.remove_topic(topic_name)
+        self._topic_types[topic_name] = type_name
+        self._topic_tokens.add(tokenize(topic_name), topic_name)
+        topics = self._type_topics.get(type_name)
+        if topics is None:
+            topics = self._type_topics[type_name] = set()
+            self._unindexed_types.add(type_name)
+        topics.add(topic_name)
+
+    def remove_topic(self, topic_name):
+        type_name = self._topic_types.pop(topic_name, None)
+        if type_name is None:
+            return
+        self._topic_tokens.remove(tokenize(topic_name), topic_name)
+        topics = self._type_topics[type_name]
+        topics.discard(topic_name)
+        if not topics:
+            del self._type_topics[type_name]
+            if type_name in self._unindexed_types:
+                self._unindexed_types.discard(type_name)
+            else:
+                for path in get_field_paths(type_name):
+                    self._field_tokens.remove(tokenize(path), (type_name, path))
+
+    def _index_fields(self):
+        for type_name in list(self._unindexed_types):
+            if self._load_field_paths or has_field_paths(type_name):
+                for path in get_field_paths(type_name):
+                    self._field_tokens.add(tokenize(path), (type_name, path))
+                self._unindexed_types.discard(type_name)
+
+    def query(self, text):
+        """
+        @param text: query, i.e. 'odom position'
+        @return: TopicFilter of the matching topics and fields, None if the
+                 query has no tokens and everything matches
+        """
+        terms = tokenize(text)
+        if not terms:
+            return None
+        self._index_fields()
+        all_terms = (1 << len(terms)) - 1
+        # bit masks of the terms matched by the topic names and field paths
+        topic_masks = {}
+        field_masks = {}
+        for bit, term in enumerate(terms):
+            for topic_name in self._topic_tokens.find_prefix(term):
+                topic_masks[topic_name] = topic_masks.get(topic_name, 0) | 1 << bit
+            for field in self._field_tokens.find_prefix(term):
+                field_masks[field] = field_masks.get(field, 0) | 1 << bit
+
+        topics = set(
+            topic_name for topic_name, mask in topic_masks.items() if mask == all_terms)
+        fields = {}
+        for (type_name, path), mask in field_masks.items():
+            # the terms not matched by the field must be matched by the topic name
+            missing = all_terms & ~mask
+            for topic_name in self._type_topics[type_name]:
+                if topic_name not in topics and \
+                        topic_masks.get(topic_name, 0) & missing == missing:
+                    fields.setdefault(topic_name, []).append(path)
+        return TopicFilter(topics, fields)
+
+
+class TopicFilter(object):
+
+    """
+    Topics and fields matching a query, as returned by TopicIndex.query().
+    """
+
+    def __init__(self, topics, fields):
+        """
+        @param topics: set of the names of the topics matching with all their fields
+        @param fields: dict of topic name -> list of the matching field paths
+        """
+        super(TopicFilter, self).__init__()
+        self.topics = topics
+        # topic name -> (set of the matching paths, set of them and their parent paths)
+        self._fields = {}
+        for topic_name, paths in fields.items():
+            parent_paths = set()
+            for path in paths:
+                while path and path not in parent_paths:
+                    parent_paths.add(path)
+                    path = path.rpartition('/')[0]
+            self._fields[topic_name] = (set(paths), parent_paths)
+
+    def accepts_topic(self, topic_name):
+        return topic_name in self.topics or topic_name in self._fields
+
+    def accepts_field(self, topic_name, field_path):
+        """
+        Fields are accepted if they match, are the parent of a matching field
+        or are below a matching field.
+
+        @param field_path: path of the field as normalized by normalize_field_path()
+        """
+        if topic_name in self.topics:
+            return True
+        fields = self._fields.get(topic_name)
+        if fields is None:
+            return False
+        paths, parent_paths = fields
+        if field_path in parent_paths:
+            return True
+        while field_path:
+            field_path = field_path.rpartition('/')[0]
+            if field_path in paths:
+                return True
+        return False
+
+
+class _TokenIndex(object):
+
+    """
+    Maps tokens to sets of entries and finds them by the prefix of the token.
+    """
+
+    def __init__(self):
+        super(_TokenIndex, self).__init__()
+        self._entries = {}
+        self._sorted_tokens = []
+
+    def add(self, tokens, entry):
+        for token in tokens:
+            entries = self._entries.get(token)
+            if entries is None:
+                entries = self._entries[token] = set()
+                insort(self._sorted_tokens, token)
+            entries.add(entry)
+
+    def remove(self, tokens, entry):
+        for token in tokens:
+            entries = self._entries.get(token)
+            if entries is None:
+                continue
+            entries.discard(entry)
+            if not entries:
+                del self._entries[token]
+                del self._sorted_tokens[bisect_left(self._sorted_tokens, token)]
+
+    def find_prefix(self, prefix):
+        """
+        @return: set of the entries of all tokens starting with prefix
+        """
+        found = set()
+        tokens = self._sorted_tokens
+        index = bisect_left(tokens, prefix)
+        while index < len(tokens) and tokens[index].startswith(prefix):
+            found.update(self._entries[tokens[index]])
+            index += 1
+        return found
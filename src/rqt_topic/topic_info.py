@@ -31,43 +31,121 @@
 # POSSIBILITY OF SUCH DAMAGE.
 
 from __future__ import division, with_statement
+import struct
+import threading
 try:
     from cStringIO import StringIO as BufferType
 except ImportError:
     from io import BytesIO as BufferType
 
-from python_qt_binding.QtCore import qWarning
-
-import roslib
+# rospy is needed by the callbacks anyway and already loaded by rqt_gui_py
+# when the plugin starts, roslib is only imported once a message class is needed
 import rospy
-from rostopic import ROSTopicHz
 
+from .profiling import clock, thread_clock
+from .publisher_statistics import PublisherStatistics
+from .rate_history import RateHistory
+from .ring_buffer import RingBuffer
+from .subscription_pool import get_subscription_pool
+from .windowed_histogram import WindowedHistogram
+from .wire_message import get_wire_buffer, get_wire_message_class, get_wire_size
+
+# seq, stamp.secs and stamp.nsecs at the start of a serialized message with header
+_HEADER_STRUCT = struct.Struct('<3I')
+
+
+class TopicInfo(object):
+
+    """
+    Statistics of a topic, computed like rostopic.ROSTopicHz does.
+
+    The message class is only loaded once it is needed, i.e. when the topic is
+    monitored, so creating the TopicInfo of many topics is cheap.
+    """
 
-class TopicInfo(ROSTopicHz):
+    # durations in seconds of the windows get_interval_percentiles() supports
+    PERCENTILE_WINDOWS = (1., 10., 60.)
+    # seconds of rate and bandwidth history and seconds per sample of it
+    HISTORY_DURATION = 300.
+    HISTORY_SLOT_DURATION = 1.
+    # window size used for a negative window_size, the same as ROSTopicHz uses
+    UNBOUNDED_WINDOW_SIZE = 50000
 
-    def __init__(self, topic_name, topic_type):
-        super(TopicInfo, self).__init__(100)
+    def __init__(self, topic_name, topic_type, window_size=100, display_rate=None):
+        """
+        @param window_size: number of messages the statistics are computed over,
+                            negative for UNBOUNDED_WINDOW_SIZE
+        @param display_rate: maximum rate at which take_display_message() hands
+                             out messages, None for no limit
+        """
+        super(TopicInfo, self).__init__()
+        self.lock = threading.Lock()
+        # the statistics keep window_size - 1 intervals, like ROSTopicHz
+        self.window_size = window_size if window_size >= 0 else self.UNBOUNDED_WINDOW_SIZE
         self._topic_name = topic_name
+        self._topic_type = topic_type
+        self.display_rate = display_rate
         self.error = None
         self._subscriber = None
         self.monitoring = False
         self._reset_data()
-        self.message_class = None
+        self._message_class = None
+        self._message_class_loaded = False
+        # messages with header start with it, see genpy.Message._has_header
+        self._has_header = False
+
+    @property
+    def message_class(self):
+        if not self._message_class_loaded:
+            self._load_message_class()
+        return self._message_class
+
+    def _load_message_class(self):
+        import roslib.message
+        self._message_class_loaded = True
         try:
-            self.message_class = roslib.message.get_message_class(topic_type)
+            self._message_class = roslib.message.get_message_class(self._topic_type)
         except Exception as e:
-            self.message_class = None
-            qWarning('TopicInfo.__init__(): %s' % (e))
+            self._message_class = None
+            rospy.logwarn('TopicInfo._load_message_class(): %s' % (e))
+
+        self._has_header = getattr(self._message_class, '_has_header', False)
 
-        if self.message_class is None:
-            self.error = 'can not get message class for type "%s"' % topic_type
-            qWarning('TopicInfo.__init__(): topic "%s": %s' % (topic_name, self.error))
+        if self._message_class is None:
+            self.error = 'can not get message class for type "%s"' % self._topic_type
+            rospy.logwarn(
+                'TopicInfo._load_message_class(): topic "%s": %s' %
+                (self._topic_name, self.error))
 
     def _reset_data(self):
-        self.last_message = None
-        self.times = []
-        self.timestamps = []
-        self.sizes = []
+        with self.lock:
+            self.last_message = None
+            self._display_message = None
+            self._display_time = None
+            # instrumentation of the overhead of monitoring this topic, cumulative
+            # CPU time of the callbacks and wall time waiting for the lock in seconds
+            self.message_count = 0
+            self.callback_time = 0.
+            self.lock_wait_time = 0.
+            self.msg_t0 = -1.
+            self.msg_tn = 0
+            # only the inter-arrival times of the last messages are kept,
+            # like ROSTopicHz does, but in ring buffers instead of lists
+            interval_count = max(self.window_size - 1, 1)
+            self.times = RingBuffer(interval_count)
+            self.timestamps = RingBuffer(interval_count)
+            self.sizes = RingBuffer(interval_count, 'L')
+            # inter-arrival times over time windows instead of a number of messages
+            self.interval_histogram = WindowedHistogram(self.PERCENTILE_WINDOWS)
+            # receipt time minus header stamp of the last messages with a stamp
+            self.latencies = RingBuffer(interval_count)
+            self.latency_histogram = WindowedHistogram(self.PERCENTILE_WINDOWS)
+            # messages stamped after their receipt, i.e. the clocks are not in sync,
+            # their negative latency would end up in the lowest bucket of the histogram
+            self.future_stamp_count = 0
+            self.history = RateHistory(self.HISTORY_DURATION, self.HISTORY_SLOT_DURATION)
+            # callerid -> PublisherStatistics, updated without the lock
+            self.publishers = {}
 
     def toggle_monitoring(self):
         if self.monitoring:
@@ -76,59 +154,254 @@ class TopicInfo(ROSTopicHz):
             self.start_monitoring()
 
     def start_monitoring(self):
-        if self.message_class is not None:
+        """
+        @return: True if the topic is monitored, False if its message class can
+                 not be loaded, the reason is in error then
+        """
+        if self.message_class is not None and self._subscriber is None:
             self.monitoring = True
-            # FIXME: subscribing to class AnyMsg breaks other subscribers on same node
-            self._subscriber = rospy.Subscriber(
-                self._topic_name, self.message_class, self.message_callback)
+            # subscribing to class AnyMsg would break other subscribers on same node,
+            # the wire message class provides the message size without that drawback,
+            # the pool shares the subscription with other monitors of the topic
+            self._subscriber = get_subscription_pool().subscribe(
+                self._topic_name, get_wire_message_class(self.message_class),
+                self.message_callback)
+        return self.monitoring
 
     def stop_monitoring(self):
         self.monitoring = False
-        self._reset_data()
         if self._subscriber is not None:
             self._subscriber.unregister()
+            self._subscriber = None
+        self._reset_data()
 
-    def message_callback(self, message):
-        ROSTopicHz.callback_hz(self, message)
+    def callback_hz(self, m, topic=None):
         with self.lock:
-            self.timestamps.append(rospy.get_time())
+            self._update_times(rospy.get_time())
+
+    def _update_times(self, current_time):
+        # same as ROSTopicHz.callback_hz() but operating on the ring buffer
+        if current_time == 0:
+            # time reset
+            self.times.clear()
+            self.interval_histogram.clear()
+            return
+        if self.msg_t0 < 0 or self.msg_t0 > current_time:
+            self.msg_t0 = current_time
+            self.msg_tn = current_time
+            self.times.clear()
+            self.interval_histogram.clear()
+        else:
+            self.times.append(current_time - self.msg_tn)
+            self.interval_histogram.add(current_time - self.msg_tn, current_time)
+            self.msg_tn = current_time
 
-            # FIXME: this only works for message of class AnyMsg
-            # self.sizes.append(len(message._buff))
-            # time consuming workaround...
+    def message_callback(self, message):
+        start_time = thread_clock()
+        size = get_wire_size(message)
+        if size is None:
+            # the subscription was created by another subscriber of this node
+            # using the plain message class, time consuming workaround...
             buff = BufferType()
             message.serialize(buff)
-            self.sizes.append(len(buff.getvalue()))
+            size = len(buff.getvalue())
+        current_time = rospy.get_time()
+        header = self._read_header(message) if self._has_header else None
+        latency = self._get_latency(header, current_time)
+        self._add_publisher_message(message, size, current_time, header)
+
+        lock_time = clock()
+        with self.lock:
+            locked_time = clock()
+            self._update_times(current_time)
+            self.timestamps.append(current_time)
+            self.sizes.append(size)
+            self.history.add(size, current_time)
+            if latency is not None:
+                self.latencies.append(latency)
+                if latency < 0:
+                    self.future_stamp_count += 1
+                else:
+                    self.latency_histogram.add(latency, current_time)
+            self.message_count += 1
+            self.lock_wait_time += locked_time - lock_time
+            self.callback_time += thread_clock() - start_time
+        # replacing the reference is atomic, readers do not need the lock for it
+        # and the message is only deserialized once its fields are accessed
+        self.last_message = message
 
-            if len(self.timestamps) > self.window_size - 1:
-                self.timestamps.pop(0)
-                self.sizes.pop(0)
-            assert(len(self.timestamps) == len(self.sizes))
+    def _read_header(self, message):
+        """
+        @return: (seq, stamp.secs, stamp.nsecs) of the header of the message or None
+        """
+        buff = get_wire_buffer(message)
+        if buff is not None and len(buff) >= _HEADER_STRUCT.size:
+            # read the header without deserializing the message
+            return _HEADER_STRUCT.unpack_from(buff)
+        try:
+            header = message.header
+            return header.seq, header.stamp.secs, header.stamp.nsecs
+        except AttributeError:
+            return None
 
-            self.last_message = message
+    def _get_latency(self, header, current_time):
+        if header is None:
+            return None
+        _, secs, nsecs = header
+        if not secs and not nsecs:
+            # the stamp was not set
+            return None
+        return current_time - (secs + nsecs * 1e-9)
 
-    def get_bw(self):
-        if len(self.timestamps) < 2:
-            return None, None, None, None
+    def _add_publisher_message(self, message, size, current_time, header):
+        connection_header = getattr(message, '_connection_header', None)
+        if not connection_header or 'callerid' not in connection_header:
+            return
+        callerid = connection_header['callerid']
+        publishers = self.publishers
+        publisher = publishers.get(callerid)
+        if publisher is None:
+            # only the receive thread of the connection adds its publisher
+            publisher = publishers.setdefault(callerid, PublisherStatistics(callerid))
+        publisher.add(
+            size, current_time, header[0] if header is not None else None, connection_header)
+
+    def get_publishers(self):
+        """
+        Publishers which sent no message for HISTORY_DURATION seconds are
+        dropped, i.e. nodes which were restarted under a new anonymous name.
+        If they send again, they start with new counters.
+
+        @return: list of the PublisherStatistics of the publishers sorted by callerid
+        """
         current_time = rospy.get_time()
-        if current_time <= self.timestamps[0]:
-            return None, None, None, None
+        publishers = self.publishers
+        for callerid, publisher in list(publishers.items()):
+            if publisher.last_time is not None and \
+                    current_time - publisher.last_time > self.HISTORY_DURATION:
+                publishers.pop(callerid, None)
+        return sorted(publishers.values(), key=lambda publisher: publisher.callerid)
+
+    def take_display_message(self):
+        """
+        Get the latest message unless it has been taken before or the display
+        rate does not allow taking another message yet.
 
+        @return: message or None
+        """
+        message = self.last_message
+        if message is None or message is self._display_message:
+            return None
+        current_time = rospy.get_time()
+        if self.display_rate and self._display_time is not None and \
+                self._display_time <= current_time < self._display_time + 1. / self.display_rate:
+            return None
+        self._display_message = message
+        self._display_time = current_time
+        return message
+
+    def get_queue_depth(self):
+        """
+        @return: number of received messages waiting in the subscriber queue,
+                 None if not monitoring or unknown
+        """
+        subscriber = self._subscriber
+        return subscriber.get_queue_depth() if subscriber is not None else None
+
+    def get_overflow(self):
+        """
+        @return: number of messages dropped since monitoring started because the
+                 subscriber queue overflowed, None if not monitoring or unknown
+        """
+        subscriber = self._subscriber
+        return subscriber.get_overflow() if subscriber is not None else None
+
+    def fit_buffer_size(self):
+        """
+        Grow the receive buffer of the subscriber to the largest recent message,
+        the topic is subscribed again in the background if needed.
+        """
+        subscriber = self._subscriber
+        if subscriber is None:
+            return
+        with self.lock:
+            if not len(self.sizes):
+                return
+            max_size = self.sizes.max()
+        subscriber.fit_buff_size(max_size)
+
+    def get_bw(self):
+        current_time = rospy.get_time()
         with self.lock:
-            total = sum(self.sizes)
+            if len(self.timestamps) < 2 or current_time <= self.timestamps[0]:
+                return None, None, None, None
+            total = self.sizes.sum()
             bytes_per_s = total / (current_time - self.timestamps[0])
-            mean_size = total / len(self.timestamps)
-            max_size = max(self.sizes)
-            min_size = min(self.sizes)
-            return bytes_per_s, mean_size, min_size, max_size
+            mean_size = total / len(self.sizes)
+            return bytes_per_s, mean_size, self.sizes.min(), self.sizes.max()
 
     def get_hz(self):
-        if not self.times:
-            return None, None, None, None
         with self.lock:
             n = len(self.times)
-            mean = sum(self.times) / n
+            if not n:
+                return None, None, None, None
+            mean = self.times.sum() / n
             rate = 1. / mean if mean > 0. else 0
-            min_delta = min(self.times)
-            max_delta = max(self.times)
-        return rate, mean, min_delta, max_delta
+            return rate, mean, self.times.min(), self.times.max()
+
+    def get_rate_history(self):
+        """
+        @return: list of the rates in messages per second of the last
+                 HISTORY_DURATION seconds, see RateHistory.get_rates()
+        """
+        current_time = rospy.get_time()
+        with self.lock:
+            history = self.history.copy()
+        return history.get_rates(current_time)
+
+    def get_bandwidth_history(self):
+        """
+        @return: list of the bandwidths in bytes per second of the last
+                 HISTORY_DURATION seconds, see RateHistory.get_bandwidths()
+        """
+        current_time = rospy.get_time()
+        with self.lock:
+            history = self.history.copy()
+        return history.get_bandwidths(current_time)
+
+    def get_interval_percentiles(self, window, percentiles=(50, 95, 99)):
+        """
+        @param window: duration of the window in seconds, one of PERCENTILE_WINDOWS
+        @param percentiles: ascending sequence of percentiles between 0 and 100
+        @return: list of the inter-arrival times in seconds at the percentiles,
+                 None if no message arrived within the window
+        """
+        current_time = rospy.get_time()
+        # merging the counts takes a while, the message callbacks must not wait for it
+        with self.lock:
+            histogram = self.interval_histogram.copy()
+        return histogram.percentiles(window, percentiles, current_time)
+
+    def get_latency(self):
+        """
+        Latency of the last messages from their header stamp to their receipt.
+
+        @return: mean, min and max latency in seconds, Nones for messages without stamp
+        """
+        with self.lock:
+            n = len(self.latencies)
+            if not n:
+                return None, None, None
+            return self.latencies.sum() / n, self.latencies.min(), self.latencies.max()
+
+    def get_latency_percentiles(self, window, percentiles=(50, 95, 99)):
+        """
+        @param window: duration of the window in seconds, one of PERCENTILE_WINDOWS
+        @param percentiles: ascending sequence of percentiles between 0 and 100
+        @return: list of the latencies in seconds at the percentiles, None if no
+                 message with stamp arrived within the window
+        """
+        current_time = rospy.get_time()
+        with self.lock:
+            histogram = self.latency_histogram.copy()
+        return histogram.percentiles(window, percentiles, current_time)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2011, Dorian Scholz, TU Darmstadt
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#   * Neither the name of the TU Darmstadt nor the names of its
+#     contributors may be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+from collections import namedtuple
+
+# XmlRpcError is imported by the callers of get_published_topics() from here
+try:
+    from xmlrpc.client import Error as XmlRpcError, ServerProxy, Transport  # noqa: F401
+except ImportError:
+    from xmlrpclib import Error as XmlRpcError, ServerProxy, Transport  # noqa: F401
+
+import rosgraph
+import rospy
+
+# added and retyped are lists of (name, type) tuples, removed is a list of names
+TopicListDiff = namedtuple('TopicListDiff', ['added', 'removed', 'retyped'])
+
+
+def get_published_topics(timeout=3.0):
+    """
+    Query the master for the published topics.
+
+    @param timeout: timeout of the query in seconds
+    @return: list of (topic_name, topic_type) tuples
+    @raise IOError: if the master can not be reached or reports a failure
+    @raise XmlRpcError: if the master responds with an invalid message
+    """
+    master = ServerProxy(rosgraph.get_master_uri(), transport=_TimeoutTransport(timeout))
+    code, msg, topic_list = master.getPublishedTopics(rospy.get_name(), '/')
+    if code != 1:
+        raise IOError(msg)
+    return [tuple(topic) for topic in topic_list]
+
+
+def diff_topic_lists(previous_topics, topics):
+    """
+    @param previous_topics: dict of topic name -> type
+    @param topics: dict of topic name -> type
+    @return: TopicListDiff of the changes from previous_topics to topics
+    """
+    added = []
+    retyped = []
+    for topic_name, topic_type in topics.items():
+        previous_type = previous_topics.get(topic_name)
+        if previous_type is None:
+            added.append((topic_name, topic_type))
+        elif previous_type != topic_type:
+            retyped.append((topic_name, topic_type))
+    removed = [
+        topic_name for topic_name in previous_topics if topic_name not in topics]
+    return TopicListDiff(added, removed, retyped)
+
+
+class _TimeoutTransport(Transport):
+
+    def __init__(self, timeout):
+        Transport.__init__(self)
+        self._timeout = timeout
+
+    def make_connection(self, host):
+        connection = Transport.make_connection(self, host)
+        connection.timeout = self._timeout
+        return connection
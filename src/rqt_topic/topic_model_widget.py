@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2011, Dorian Scholz, TU Darmstadt
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#   * Neither the name of the TU Darmstadt nor the names of its
+#     contributors may be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+from python_qt_binding.QtCore import Qt, Slot
+from python_qt_binding.QtWidgets import QAbstractItemView, QTreeView
+
+from .topic_tree_model import TopicSortFilterProxyModel, TopicTreeModel
+from .topic_widget import TopicWidget
+
+
+class TopicModelWidget(TopicWidget):
+
+    """
+    TopicWidget showing the topics in a QTreeView backed by a TopicTreeModel.
+
+    Instead of a QTreeWidgetItem for each field it keeps a compact tree of
+    nodes and only notifies the view about rows which actually changed, which
+    scales to large graphs with many topics and deep messages.
+    """
+
+    def _create_tree_view(self):
+        tree_widget = self.topics_tree_widget
+        header_item = tree_widget.headerItem()
+        self._model = TopicTreeModel(
+            self._column_names,
+            [header_item.text(column) for column in range(len(self._column_names))],
+            self._toggle_monitoring, self._value_renderer, self)
+        self._proxy_model = TopicSortFilterProxyModel(
+            [self._column_index[column_name] for column_name in self._sort_by_data_columns], self)
+        self._proxy_model.setSourceModel(self._model)
+
+        view = QTreeView(self)
+        view.setObjectName('topics_tree_view')
+        view.setModel(self._proxy_model)
+        view.setUniformRowHeights(True)
+        view.setContextMenuPolicy(Qt.CustomContextMenu)
+        view.setToolTip(tree_widget.toolTip())
+        view.setDragEnabled(True)
+        view.setDragDropMode(QAbstractItemView.DragOnly)
+        view.setSortingEnabled(True)
+        view.customContextMenuRequested.connect(self._handle_tree_view_context_menu)
+        view.expanded.connect(self._handle_index_expanded)
+        view.collapsed.connect(self._handle_index_collapsed)
+
+        # replace the tree widget of the ui file
+        layout = self.layout()
+        layout.insertWidget(layout.indexOf(tree_widget), view)
+        layout.removeWidget(tree_widget)
+        tree_widget.hide()
+        return view
+
+    def _create_topic_items(self, topics):
+        return self._model.add_topics(topics)
+
+    def _remove_topic_items(self, topic_names, items):
+        self._model.remove_topics(items)
+
+    def _set_topic_monitored(self, topic_name, monitored):
+        self._model.set_checked(self._topics[topic_name]['item'], monitored)
+
+    def _apply_topic_filter(self):
+        self._proxy_model.set_topic_filter(self._topic_filter)
+
+    def _set_header_label(self, column, text):
+        self._model.set_header_label(column, text)
+
+    def _set_topic_row(self, topic_name, texts, sort_data):
+        self._model.set_topic_data(self._topics[topic_name]['item'], texts, sort_data)
+
+    def _set_publisher_rows(self, topic_name, rows):
+        self._model.set_publisher_rows(self._topics[topic_name]['item'], rows)
+
+    def _update_topic_rows(self):
+        super(TopicModelWidget, self)._update_topic_rows()
+        self._tick_timer.start('notify')
+        self._model.emit_topic_data_changed()
+
+    def update_value(self, topic_name, message):
+        self._model.update_values(self._topics[topic_name]['item'], message)
+
+    def _toggle_monitoring(self, topic_name):
+        node = self._topics[topic_name]['item']
+        if node.checked:
+            if not self._topics[topic_name]['info'].start_monitoring():
+                # the message class can not be loaded, the row shows the error
+                self._model.set_checked(node, False)
+        else:
+            self._topics[topic_name]['info'].stop_monitoring()
+            self._model.forget_values(node)
+
+    @Slot('QModelIndex')
+    def _handle_index_expanded(self, index):
+        self._model.set_expanded(self._proxy_model.mapToSource(index), True)
+        self._schedule_update_visible_values()
+
+    @Slot('QModelIndex')
+    def _handle_index_collapsed(self, index):
+        self._model.set_expanded(self._proxy_model.mapToSource(index), False)
+
+    @Slot('QPoint')
+    def _handle_tree_view_context_menu(self, pos):
+        index = self._tree_view.indexAt(pos)
+        if not index.isValid():
+            return
+
+        expanded = self._exec_item_context_menu(pos)
+        if expanded is not None:
+            self._set_expanded_recursively(index.sibling(index.row(), 0), expanded)
+
+    def _set_expanded_recursively(self, index, expanded):
+        model = self._proxy_model
+        if expanded and model.canFetchMore(index):
+            model.fetchMore(index)
+        self._tree_view.setExpanded(index, expanded)
+        for row in range(model.rowCount(index)):
+            self._set_expanded_recursively(model.index(row, 0, index), expanded)
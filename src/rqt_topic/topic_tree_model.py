@@ -0,0 +1,558 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2011, Dorian Scholz, TU Darmstadt
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#   * Neither the name of the TU Darmstadt nor the names of its
+#     contributors may be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+from python_qt_binding.QtCore import QAbstractItemModel, QModelIndex, \
+    QSortFilterProxyModel, Qt
+
+from .message_layout import get_message_layout, MessageLayout, parse_array_type
+
+
+# pending value of topic nodes whose layout is resolved when they are fetched
+_UNRESOLVED_LAYOUT = object()
+
+
+class TopicNode(object):
+
+    """
+    Node of the tree backing TopicTreeModel, one for each message field shown.
+    """
+
+    LEAF = 0
+    MESSAGE = 1
+    MESSAGE_ARRAY = 2
+
+    __slots__ = (
+        'parent', 'row', 'name', 'type_name', 'kind', 'children', 'pending', 'expanded',
+        'value')
+
+    def __init__(self, parent, row, name, type_name):
+        self.parent = parent
+        # also the index of the field in the parent message or array
+        self.row = row
+        self.name = name
+        self.type_name = type_name
+        base_type_name, array_size = parse_array_type(type_name)
+        layout = get_message_layout(base_type_name)
+        # child nodes, None until they are created
+        self.children = None
+        # MessageLayout or number of array elements the child nodes are
+        # created from when fetched
+        self.pending = None
+        if layout is None:
+            self.kind = TopicNode.LEAF
+        elif array_size is None:
+            self.kind = TopicNode.MESSAGE
+            if layout.fields:
+                self.pending = layout
+        else:
+            self.kind = TopicNode.MESSAGE_ARRAY
+            if array_size:
+                self.pending = array_size
+        self.expanded = False
+        self.value = ''
+
+
+class TopicRootNode(TopicNode):
+
+    """
+    Node of a topic, holding the texts and sort data of all columns.
+    """
+
+    __slots__ = ('checked', 'texts', 'sort_data')
+
+    def __init__(self, parent, row, topic_name, type_name, column_count):
+        # unlike the field nodes, the layout of the type is only loaded once the
+        # node is fetched, loading the message classes of all topics would delay
+        # showing them
+        self.parent = parent
+        self.row = row
+        self.name = topic_name
+        self.type_name = type_name
+        self.kind = TopicNode.MESSAGE
+        self.children = None
+        self.pending = _UNRESOLVED_LAYOUT
+        self.expanded = False
+        self.value = ''
+        self.checked = False
+        self.texts = [None] * column_count
+        self.sort_data = [None] * column_count
+
+
+class PublisherNode(TopicNode):
+
+    """
+    Node of a publisher of a topic, following the field nodes of the topic.
+    """
+
+    __slots__ = ('texts',)
+
+    def __init__(self, parent, row, callerid, column_count):
+        super(PublisherNode, self).__init__(parent, row, callerid, 'publisher')
+        self.texts = [None] * column_count
+
+
+class TopicTreeModel(QAbstractItemModel):
+
+    """
+    Item model of the topics and their message fields.
+
+    Child nodes are created when the view fetches them, i.e. when a node is
+    expanded for the first time. Updates only emit dataChanged for the ranges
+    of rows whose text actually changed.
+    """
+
+    def __init__(self, column_names, header_labels, check_state_changed_callback,
+                 value_renderer, parent=None):
+        """
+        @param column_names: names of the columns, must include topic, type and value
+        @param header_labels: header text of the columns
+        @param check_state_changed_callback: called with the topic name when a
+                                             topic is checked or unchecked
+        @param value_renderer: ValueRenderer used to render the field values
+        """
+        super(TopicTreeModel, self).__init__(parent)
+        self._column_names = column_names
+        self._header_labels = header_labels
+        self._column_index = dict(
+            (column_name, column) for column, column_name in enumerate(column_names))
+        self._topic_column = self._column_index['topic']
+        self._type_column = self._column_index['type']
+        self._value_column = self._column_index['value']
+        self._check_state_changed_callback = check_state_changed_callback
+        self._value_renderer = value_renderer
+        self._root = TopicNode(None, 0, '', '')
+        self._root.children = []
+        self._changed_rows = set()
+
+    def add_topics(self, topics):
+        """
+        @param topics: list of (topic_name, type_name) tuples
+        @return: list of the created TopicRootNode
+        """
+        children = self._root.children
+        first = len(children)
+        nodes = [
+            TopicRootNode(self._root, row, topic_name, type_name, len(self._column_names))
+            for row, (topic_name, type_name) in enumerate(topics, first)]
+        if nodes:
+            self.beginInsertRows(QModelIndex(), first, first + len(nodes) - 1)
+            children.extend(nodes)
+            self.endInsertRows()
+        return nodes
+
+    def remove_topics(self, nodes):
+        """
+        @param nodes: list of TopicRootNode to remove
+        """
+        children = self._root.children
+        for first, last in reversed(list(_ranges(sorted(node.row for node in nodes)))):
+            self.beginRemoveRows(QModelIndex(), first, last)
+            for node in children[first:last + 1]:
+                self.forget_values(node)
+            del children[first:last + 1]
+            self.endRemoveRows()
+        for row in range(len(children)):
+            children[row].row = row
+
+    def set_topic_data(self, node, texts, sort_data):
+        """
+        Set the texts and sort data of a topic row, the views are notified by
+        emit_topic_data_changed().
+
+        @param texts: text by column name
+        @param sort_data: data to sort by, by column name
+        """
+        changed = False
+        for column_name, text in texts.items():
+            column = self._column_index[column_name]
+            if node.texts[column] != text:
+                node.texts[column] = text
+                changed = True
+        for column_name, value in sort_data.items():
+            column = self._column_index[column_name]
+            if node.sort_data[column] != value:
+                node.sort_data[column] = value
+                changed = True
+        if changed:
+            self._changed_rows.add(node.row)
+
+    def set_publisher_rows(self, node, rows):
+        """
+        Show a child row below a topic for each of its publishers.
+
+        @param rows: list of (callerid, text by column name)
+        """
+        children = node.children or []
+        publishers = [child for child in children if isinstance(child, PublisherNode)]
+        if not rows and not publishers:
+            return
+        # the children of a topic which has not been expanded yet are only publishers
+        node.children = children
+        index = self.createIndex(node.row, 0, node)
+        first = len(children) - len(publishers)
+        if [publisher.name for publisher in publishers] != [callerid for callerid, _ in rows]:
+            if publishers:
+                self.beginRemoveRows(index, first, len(children) - 1)
+                del children[first:]
+                self.endRemoveRows()
+            if rows:
+                self.beginInsertRows(index, first, first + len(rows) - 1)
+                children.extend(
+                    PublisherNode(node, row, callerid, len(self._column_names))
+                    for row, (callerid, _) in enumerate(rows, first))
+                self.endInsertRows()
+            publishers = children[first:]
+        changed_rows = []
+        for publisher, (_, texts) in zip(publishers, rows):
+            changed = False
+            for column_name, text in texts.items():
+                column = self._column_index[column_name]
+                if publisher.texts[column] != text:
+                    publisher.texts[column] = text
+                    changed = True
+            if changed:
+                changed_rows.append(publisher.row)
+        last_column = len(self._column_names) - 1
+        for first_row, last_row in _ranges(changed_rows):
+            self.dataChanged.emit(
+                self.index(first_row, 0, index), self.index(last_row, last_column, index))
+
+    def emit_topic_data_changed(self):
+        last_column = len(self._column_names) - 1
+        for first, last in _ranges(sorted(self._changed_rows)):
+            self.dataChanged.emit(self.index(first, 0), self.index(last, last_column))
+        self._changed_rows.clear()
+
+    def update_values(self, node, message, path=None):
+        """
+        Update the values of the fields below an expanded node from the message.
+
+        @param path: path of the node, the key of the cached values of its fields
+        """
+        if node.children is None or not node.expanded or message is None:
+            return
+        if path is None:
+            path = self.node_path(node)
+        children = node.children
+        is_message = node.kind == TopicNode.MESSAGE
+        if is_message:
+            slot_names = message.__slots__
+        changed_rows = []
+        for child in children:
+            if isinstance(child, PublisherNode):
+                # publishers follow the fields
+                break
+            if is_message:
+                value = getattr(message, slot_names[child.row])
+                child_path = path + '/' + child.name
+            else:
+                value = message[child.row]
+                child_path = path + child.name
+
+            if child.kind == TopicNode.LEAF:
+                text = self._value_renderer.render(child_path, value, child.type_name)
+                if child.value != text:
+                    child.value = text
+                    changed_rows.append(child.row)
+            else:
+                if child.kind == TopicNode.MESSAGE_ARRAY:
+                    self._update_element_nodes(child, value)
+                self.update_values(child, value, child_path)
+
+        if changed_rows:
+            parent = self.createIndex(node.row, 0, node)
+            for first, last in _ranges(changed_rows):
+                self.dataChanged.emit(
+                    self.index(first, self._value_column, parent),
+                    self.index(last, self._value_column, parent))
+
+    def set_expanded(self, index, expanded):
+        if index.isValid():
+            index.internalPointer().expanded = expanded
+
+    def forget_values(self, node):
+        """
+        drop the cached values of the node and all its child nodes
+        """
+        self._value_renderer.forget(self.node_path(node))
+        self._clear_values(node)
+
+    def _clear_values(self, node):
+        node.value = ''
+        for child in node.children or ():
+            self._clear_values(child)
+
+    def node_path(self, node):
+        names = []
+        while node.parent is not self._root:
+            names.append(node.name if node.name.startswith('[') else '/' + node.name)
+            node = node.parent
+        names.append(node.name)
+        return ''.join(reversed(names))
+
+    def _update_element_nodes(self, node, elements):
+        if node.pending is not None:
+            # not fetched yet, create the children for the current elements
+            node.pending = len(elements) or None
+            return
+        children = node.children or []
+        count = len(children)
+        if len(elements) == count:
+            return
+        index = self.createIndex(node.row, 0, node)
+        if not node.expanded:
+            # drop the element nodes of collapsed arrays instead of resizing them
+            # for every message, they are fetched again when the node is expanded
+            if count:
+                self.beginRemoveRows(index, 0, count - 1)
+                self._value_renderer.forget(self.node_path(node))
+                del children[:]
+                self.endRemoveRows()
+            node.children = children
+            node.pending = len(elements) or None
+        elif len(elements) > count:
+            base_type_name, _ = parse_array_type(node.type_name)
+            self.beginInsertRows(index, count, len(elements) - 1)
+            children.extend(
+                TopicNode(node, row, '[%d]' % row, base_type_name)
+                for row in range(count, len(elements)))
+            node.children = children
+            self.endInsertRows()
+        else:
+            self.beginRemoveRows(index, len(elements), count - 1)
+            for child in children[len(elements):]:
+                self.forget_values(child)
+            del children[len(elements):]
+            self.endRemoveRows()
+
+    def _create_child_nodes(self, index, node):
+        pending = node.pending
+        node.pending = None
+        if pending is _UNRESOLVED_LAYOUT:
+            pending = get_message_layout(node.type_name) or MessageLayout(node.type_name, [])
+        if isinstance(pending, MessageLayout):
+            children = [
+                TopicNode(node, row, field.name, field.type_name)
+                for row, field in enumerate(pending.fields)]
+        else:
+            base_type_name, _ = parse_array_type(node.type_name)
+            children = [
+                TopicNode(node, row, '[%d]' % row, base_type_name) for row in range(pending)]
+        # the fields are inserted before the publishers of a topic
+        publishers = node.children or []
+        if children:
+            self.beginInsertRows(index, 0, len(children) - 1)
+        for row, publisher in enumerate(publishers, len(children)):
+            publisher.row = row
+        node.children = children + publishers
+        if children:
+            self.endInsertRows()
+
+    def _node(self, index):
+        if index.isValid():
+            return index.internalPointer()
+        return self._root
+
+    def index(self, row, column, parent=QModelIndex()):
+        children = self._node(parent).children
+        if children is None or not 0 <= row < len(children) or \
+                not 0 <= column < len(self._column_names):
+            return QModelIndex()
+        return self.createIndex(row, column, children[row])
+
+    def parent(self, index):
+        if not index.isValid():
+            return QModelIndex()
+        parent_node = index.internalPointer().parent
+        if parent_node is self._root:
+            return QModelIndex()
+        return self.createIndex(parent_node.row, 0, parent_node)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        children = self._node(parent).children
+        return len(children) if children is not None else 0
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(self._column_names)
+
+    def hasChildren(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return False
+        node = self._node(parent)
+        return node.pending is not None or bool(node.children)
+
+    def canFetchMore(self, parent):
+        return parent.isValid() and parent.internalPointer().pending is not None
+
+    def fetchMore(self, parent):
+        if self.canFetchMore(parent):
+            self._create_child_nodes(parent.sibling(parent.row(), 0), parent.internalPointer())
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsDragEnabled
+        if index.column() == self._topic_column and \
+                index.internalPointer().parent is self._root:
+            flags |= Qt.ItemIsUserCheckable
+        return flags
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        node = index.internalPointer()
+        column = index.column()
+        is_topic = node.parent is self._root
+        if isinstance(node, PublisherNode):
+            if role == Qt.DisplayRole:
+                if column == self._topic_column:
+                    return node.name
+                if column == self._type_column:
+                    return node.type_name
+                return node.texts[column]
+            return None
+        if role == Qt.DisplayRole:
+            if column == self._topic_column:
+                return node.name
+            if column == self._type_column:
+                return node.type_name
+            if is_topic:
+                return node.texts[column]
+            if column == self._value_column:
+                return node.value
+        elif role == Qt.CheckStateRole:
+            if is_topic and column == self._topic_column:
+                return Qt.Checked if node.checked else Qt.Unchecked
+        elif role == Qt.UserRole:
+            if column == self._topic_column:
+                return self.node_path(node)
+            if is_topic:
+                return node.sort_data[column]
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.CheckStateRole or not index.isValid() or \
+                index.column() != self._topic_column:
+            return False
+        node = index.internalPointer()
+        if node.parent is not self._root:
+            return False
+        checked = value == Qt.Checked
+        if node.checked != checked:
+            node.checked = checked
+            self.dataChanged.emit(index, index)
+            self._check_state_changed_callback(node.name)
+        return True
+
+    def set_checked(self, node, checked):
+        """
+        Check or uncheck a topic like the user does.
+        """
+        self.setData(
+            self.createIndex(node.row, self._topic_column, node),
+            Qt.Checked if checked else Qt.Unchecked, Qt.CheckStateRole)
+
+    def set_header_label(self, column, text):
+        self._header_labels[column] = text
+        self.headerDataChanged.emit(Qt.Horizontal, column, column)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole and \
+                0 <= section < len(self._header_labels):
+            return self._header_labels[section]
+        return None
+
+
+class TopicSortFilterProxyModel(QSortFilterProxyModel):
+
+    """
+    Sorts the columns listed in sort_by_data_columns by their Qt.UserRole data
+    and filters the rows by a TopicFilter.
+    """
+
+    def __init__(self, sort_by_data_columns, parent=None):
+        super(TopicSortFilterProxyModel, self).__init__(parent)
+        self._sort_by_data_columns = sort_by_data_columns
+        self._topic_filter = None
+
+    def set_topic_filter(self, topic_filter):
+        """
+        @param topic_filter: TopicFilter of the rows to show, None to show all rows
+        """
+        self._topic_filter = topic_filter
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        topic_filter = self._topic_filter
+        if topic_filter is None:
+            return True
+        node = self.sourceModel().index(source_row, 0, source_parent).internalPointer()
+        if isinstance(node, TopicRootNode):
+            return topic_filter.accepts_topic(node.name)
+        if isinstance(node, PublisherNode):
+            # shown with their topic
+            return True
+        # array elements share the path of the array
+        names = []
+        while not isinstance(node, TopicRootNode):
+            if not node.name.startswith('['):
+                names.append(node.name)
+            node = node.parent
+        return topic_filter.accepts_field(node.name, '/'.join(reversed(names)))
+
+    def lessThan(self, left, right):
+        if left.column() in self._sort_by_data_columns:
+            left_data = left.data(Qt.UserRole)
+            right_data = right.data(Qt.UserRole)
+            if left_data is None or right_data is None:
+                return left_data is None and right_data is not None
+            return left_data < right_data
+        return super(TopicSortFilterProxyModel, self).lessThan(left, right)
+
+
+def _ranges(rows):
+    """
+    @param rows: sorted row numbers
+    @return: generator of (first, last) tuples of consecutive rows
+    """
+    first = last = None
+    for row in rows:
+        if last is not None and row == last + 1:
+            last = row
+            continue
+        if first is not None:
+            yield first, last
+        first = last = row
+    if first is not None:
+        yield first, last
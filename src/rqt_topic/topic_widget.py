@@ -32,17 +32,59 @@
 
 from __future__ import division
 import os
+import re
 
 from python_qt_binding import loadUi
 from python_qt_binding.QtCore import Qt, QTimer, Signal, Slot
 from python_qt_binding.QtGui import QIcon
-from python_qt_binding.QtWidgets import QHeaderView, QMenu, QTreeWidgetItem, QWidget
-import roslib
-import rospkg
+from python_qt_binding.QtWidgets import QDialog, QDialogButtonBox, QDoubleSpinBox, QFileDialog, \
+    QFormLayout, QHeaderView, QLabel, QLineEdit, QMenu, QMessageBox, QSpinBox, QTreeWidgetItem, \
+    QWidget
 import rospy
 from rospy.exceptions import ROSException
 
+from .adaptive_timer import AdaptiveTimer
+from .message_layout import get_message_layout, parse_array_type
+from .monitor_scheduler import MonitorScheduler
+from .profiling import clock, PhaseTimer
+from .sparkline_delegate import SparklineDelegate
+from .statistics_writer import get_topic_statistics, StatisticsWriter
+from .subscription_pool import get_subscription_pool
+from .topic_discovery import TopicDiscovery
+from .topic_index import normalize_field_path, TopicIndex
 from .topic_info import TopicInfo
+from .value_renderer import ValueRenderer
+
+# resource folders relative to this module in the source and devel space and
+# in the install space, tried before falling back to rospkg
+_RESOURCE_DIRS = [
+    os.path.join('..', '..', 'resource'),
+    os.path.join('..', '..', '..', '..', 'share', 'rqt_topic', 'resource'),
+]
+_resource_paths = {}
+
+
+def _get_resource_path(file_name):
+    """
+    Return the path of a file in the resource folder of the package, cached per file.
+
+    rospkg crawls the ROS_PACKAGE_PATH to find the package, which takes seconds in
+    large workspaces, so it is only used if the file is not found next to this module.
+    """
+    try:
+        return _resource_paths[file_name]
+    except KeyError:
+        pass
+    module_dir = os.path.dirname(os.path.abspath(__file__))
+    for resource_dir in _RESOURCE_DIRS:
+        path = os.path.normpath(os.path.join(module_dir, resource_dir, file_name))
+        if os.path.isfile(path):
+            break
+    else:
+        import rospkg
+        path = os.path.join(rospkg.RosPack().get_path('rqt_topic'), 'resource', file_name)
+    _resource_paths[file_name] = path
+    return path
 
 
 class TopicWidget(QWidget):
@@ -55,10 +97,27 @@ class TopicWidget(QWidget):
     TopicWidget.start must be called in order to update topic pane.
     """
 
-    SELECT_BY_NAME = 0
-    SELECT_BY_MSGTYPE = 1
+    SELECT_BY_NAME = TopicDiscovery.SELECT_BY_NAME
+    SELECT_BY_MSGTYPE = TopicDiscovery.SELECT_BY_MSGTYPE
+
+    _column_names = [
+        'topic', 'type', 'bandwidth', 'rate', 'latency', 'p50', 'p95', 'p99', 'callback',
+        'queue', 'sampled', 'value']
+    # columns which are sorted by their Qt.UserRole data instead of their text
+    _sort_by_data_columns = [
+        'bandwidth', 'rate', 'latency', 'p50', 'p95', 'p99', 'callback', 'queue', 'sampled']
+    # columns showing percentiles of the inter-arrival times, hidden unless a window is chosen
+    _percentile_column_names = ['p50', 'p95', 'p99']
+    _percentiles = (50, 95, 99)
+    # columns showing the overhead of monitoring, hidden unless profiling is shown
+    _profiling_column_names = ['callback', 'queue']
+    _interval_settings = ['discovery_interval', 'statistics_interval', 'value_interval']
 
-    _column_names = ['topic', 'type', 'bandwidth', 'rate', 'value']
+    # default intervals in milliseconds, values of topics are shown at
+    # every statistics update unless the value interval is larger
+    DISCOVERY_INTERVAL = 5000
+    STATISTICS_INTERVAL = 500
+    VALUE_INTERVAL = 0
 
     def __init__(self, plugin=None, selected_topics=None, select_topic_type=SELECT_BY_NAME):
         """
@@ -71,40 +130,94 @@ class TopicWidget(QWidget):
                                   None, this arg shouldn't be meaningful.
         """
         super(TopicWidget, self).__init__()
+        # the startup duration is measured until the first topic list is shown
+        self._construction_time = clock()
+        self._startup_duration = None
 
         self._select_topic_type = select_topic_type
 
-        rp = rospkg.RosPack()
-        ui_file = os.path.join(rp.get_path('rqt_topic'), 'resource', 'TopicWidget.ui')
-        loadUi(ui_file, self)
+        loadUi(_get_resource_path('TopicWidget.ui'), self)
         self._plugin = plugin
-        self.topics_tree_widget.sortByColumn(0, Qt.AscendingOrder)
-        header = self.topics_tree_widget.header()
-        try:
-            setSectionResizeMode = header.setSectionResizeMode  # Qt5
-        except AttributeError:
-            setSectionResizeMode = header.setResizeMode  # Qt4
-        setSectionResizeMode(QHeaderView.ResizeToContents)
-        header.customContextMenuRequested.connect(
-            self.handle_header_view_customContextMenuRequested)
-        header.setContextMenuPolicy(Qt.CustomContextMenu)
 
         # Whether to get all topics or only the topics that are set in advance.
         # Can be also set by the setter method "set_selected_topics".
         self._selected_topics = selected_topics
 
-        self._current_topic_list = []
         self._topics = {}
         self._tree_items = {}
+        # type of items whose child items have not been created yet
+        self._pending_children = {}
+        self._value_renderer = ValueRenderer()
+        # exports the statistics of the monitored topics while not None
+        self._statistics_writer = None
+        self._value_interval = self.VALUE_INTERVAL
+        # monitors the topics matching patterns within a budget
+        self._monitor_scheduler = MonitorScheduler()
+        # index of the topic names and field paths to filter the rows by,
+        # the field paths are loaded by the topic discovery in the background
+        self._topic_index = TopicIndex(load_field_paths=False)
+        self._filter_text = ''
+        self._topic_filter = None
         self._column_index = {}
         for column_name in self._column_names:
             self._column_index[column_name] = len(self._column_index)
 
+        # the view showing the topics, which is the topics_tree_widget
+        # unless a subclass provides a different one
+        self._tree_view = self._create_tree_view()
+        self._tree_view.sortByColumn(0, Qt.AscendingOrder)
+        header = self._tree_view.header()
+        try:
+            setSectionResizeMode = header.setSectionResizeMode  # Qt5
+        except AttributeError:
+            setSectionResizeMode = header.setResizeMode  # Qt4
+        setSectionResizeMode(QHeaderView.ResizeToContents)
+        header.customContextMenuRequested.connect(
+            self.handle_header_view_customContextMenuRequested)
+        header.setContextMenuPolicy(Qt.CustomContextMenu)
+        self._tree_view.verticalScrollBar().valueChanged.connect(
+            self._schedule_update_visible_values)
+        # draws the rate and bandwidth history next to their current values
+        self._sparkline_delegate = SparklineDelegate(self._get_history, self._tree_view)
+        for column_name in ['bandwidth', 'rate']:
+            self._tree_view.setItemDelegateForColumn(
+                self._column_index[column_name], self._sparkline_delegate)
+
+        # durations of the phases of the last statistics update
+        self._tick_timer = PhaseTimer()
+        self._discovery_apply_duration = None
+        self._profiling_label = QLabel(self)
+        self._profiling_label.setWordWrap(True)
+        self.layout().addWidget(self._profiling_label)
+        self.set_profiling_enabled(False)
+        self.set_percentile_window(None)
+        self.set_monitor_patterns([])
+
         # self.refresh_topics()
 
-        # init and start update timer
-        self._timer_refresh_topics = QTimer(self)
-        self._timer_refresh_topics.timeout.connect(self.refresh_topics)
+        self._topic_discovery = TopicDiscovery(self)
+        self._topic_discovery.topics_discovered.connect(self._handle_topics_discovered)
+        self._topic_discovery.query_finished.connect(self._handle_topic_query_finished)
+        self._topic_discovery.field_paths_loaded.connect(self._handle_field_paths_loaded)
+        # seconds spent applying discovered topics since the last finished query
+        self._unreported_apply_duration = 0.
+
+        # the topic list changes rarely compared to the statistics and values,
+        # both timers back off while their updates are expensive
+        self._timer_discover_topics = AdaptiveTimer(
+            self._request_topic_discovery, self.DISCOVERY_INTERVAL, asynchronous=True,
+            parent=self)
+        self._timer_update_topics_data = AdaptiveTimer(
+            self._update_topics_data, self.STATISTICS_INTERVAL, parent=self)
+
+        # catch up on values of rows which became visible since the last update
+        self._timer_update_visible_values = QTimer(self)
+        self._timer_update_visible_values.setSingleShot(True)
+        self._timer_update_visible_values.timeout.connect(self._update_visible_values)
+
+    def _create_tree_view(self):
+        self.topics_tree_widget.itemExpanded.connect(self._handle_item_expanded)
+        return self.topics_tree_widget
 
     def set_topic_specifier(self, specifier):
         self._select_topic_type = specifier
@@ -113,132 +226,648 @@ class TopicWidget(QWidget):
         """
         This method needs to be called to start updating topic pane.
         """
-        self._timer_refresh_topics.start(1000)
+        # query the topic list right away instead of waiting for the first tick
+        self._request_topic_discovery()
+        self._timer_discover_topics.start()
+        self._timer_update_topics_data.start()
+
+    def refresh_intervals(self):
+        """
+        @return: (discovery_interval, statistics_interval, value_interval) in milliseconds
+        """
+        return (
+            self._timer_discover_topics.interval(), self._timer_update_topics_data.interval(),
+            self._value_interval)
+
+    def set_refresh_intervals(self, discovery_interval, statistics_interval, value_interval=0):
+        """
+        @param discovery_interval: interval in milliseconds to query the topic list
+        @param statistics_interval: interval in milliseconds to update rates and values
+        @param value_interval: minimum interval in milliseconds between showing
+                               messages of the same topic
+        """
+        self._timer_discover_topics.set_interval(max(100, int(discovery_interval)))
+        self._timer_update_topics_data.set_interval(max(50, int(statistics_interval)))
+        self._value_interval = max(0, int(value_interval))
+        for topic in self._topics.values():
+            topic['info'].display_rate = self._display_rate()
+
+    def _display_rate(self):
+        return 1000. / self._value_interval if self._value_interval else None
+
+    def subscriber_queue_size(self):
+        """
+        @return: number of messages queued per connection, 0 for no limit
+        """
+        return get_subscription_pool().queue_size() or 0
+
+    def set_subscriber_queue_size(self, queue_size):
+        """
+        Set the queue size of the subscribers of all monitored topics of the process.
+
+        The subscribers are shared by all instances of the plugin, so the queue
+        size is saved with the plugin settings instead of the instance settings.
+        The topics are subscribed again in the background.
+
+        @param queue_size: number of messages queued per connection, 0 for no limit
+        """
+        get_subscription_pool().set_queue_size(max(0, int(queue_size)) or None)
+
+    def edit_refresh_intervals(self):
+        """
+        Let the user choose the refresh intervals and the subscriber queue size in a dialog.
+        """
+        dialog = QDialog(self)
+        dialog.setWindowTitle('Monitor Settings')
+        layout = QFormLayout(dialog)
+        spin_boxes = []
+        for label, interval, minimum in zip(
+                ['Topic discovery', 'Statistics', 'Values (0 for every update)'],
+                self.refresh_intervals(), [100, 50, 0]):
+            spin_box = QSpinBox(dialog)
+            spin_box.setRange(minimum, 600000)
+            spin_box.setSingleStep(100)
+            spin_box.setSuffix(' ms')
+            spin_box.setValue(interval)
+            layout.addRow(label, spin_box)
+            spin_boxes.append(spin_box)
+        queue_size_spin_box = QSpinBox(dialog)
+        queue_size_spin_box.setRange(0, 100000)
+        queue_size_spin_box.setSpecialValueText('unlimited')
+        queue_size_spin_box.setSuffix(' messages')
+        queue_size_spin_box.setValue(self.subscriber_queue_size())
+        layout.addRow('Subscriber queue size', queue_size_spin_box)
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel, parent=dialog)
+        buttons.accepted.connect(dialog.accept)
+        buttons.rejected.connect(dialog.reject)
+        layout.addRow(buttons)
+        if dialog.exec_() == QDialog.Accepted:
+            self.set_refresh_intervals(*[spin_box.value() for spin_box in spin_boxes])
+            self.set_subscriber_queue_size(queue_size_spin_box.value())
 
     @Slot()
     def refresh_topics(self):
         """
         refresh tree view items
         """
+        self._request_topic_discovery()
+        self._update_topics_data()
+
+    def _request_topic_discovery(self):
+        # the topic list is queried in the background and applied once received
+        self._topic_discovery.request_refresh(self._selected_topics, self._select_topic_type)
+
+    @Slot(object)
+    def _handle_topics_discovered(self, topic_diff):
+        tree = self._tree_view
+        # apply all changes at once without sorting and repainting for each of them
+        start_time = clock()
+        sorting_enabled = tree.isSortingEnabled()
+        tree.setSortingEnabled(False)
+        tree.setUpdatesEnabled(False)
+        auto_resize = self._suspend_auto_resize()
+        try:
+            # topics which changed their type are recreated
+            self._remove_topics(
+                topic_diff.removed + [topic_name for topic_name, _ in topic_diff.retyped])
+            self._add_topics(topic_diff.added + topic_diff.retyped)
+            if self._topic_filter is not None:
+                self._topic_filter = self._topic_index.query(self._filter_text)
+                self._apply_topic_filter()
+        finally:
+            self._resume_auto_resize(auto_resize)
+            tree.setUpdatesEnabled(True)
+            tree.setSortingEnabled(sorting_enabled)
+        self._discovery_apply_duration = clock() - start_time
+        self._unreported_apply_duration += self._discovery_apply_duration
+
+        self._update_topics_data()
+        if self._startup_duration is None:
+            self._startup_duration = clock() - self._construction_time
+            rospy.logdebug(
+                'TopicWidget: showed %d topics %.1f ms after construction' %
+                (len(self._topics), self._startup_duration * 1000.))
+
+    @Slot(float)
+    def _handle_topic_query_finished(self, query_duration):
+        # the discovery timer only starts the query, it backs off by the time
+        # spent querying the master in the background and applying the topics
+        self._timer_discover_topics.report_duration(
+            (query_duration + self._unreported_apply_duration) * 1000.)
+        self._unreported_apply_duration = 0.
+
+    @Slot()
+    def _handle_field_paths_loaded(self):
+        # the fields of new types are only matched once their paths are loaded
+        if self._topic_filter is not None:
+            self.set_filter_text(self._filter_text)
+
+    def startup_duration(self):
+        """
+        @return: seconds from constructing the widget until the first topic list
+                 was shown, None until then
+        """
+        return self._startup_duration
+
+    def _add_topics(self, topic_list):
+        # add them to the tree view and the dict
+        topic_items = self._create_topic_items(topic_list)
+        for (topic_name, topic_type), topic_item in zip(topic_list, topic_items):
+            topic_info = TopicInfo(topic_name, topic_type, display_rate=self._display_rate())
+            self._topic_index.add_topic(topic_name, topic_type)
+            self._topics[topic_name] = {
+                'item': topic_item,
+                'info': topic_info,
+                'type': topic_type,
+                # callerid -> QTreeWidgetItem of the publishers shown below the topic
+                'publisher_items': {},
+            }
+
+    def _create_topic_items(self, topic_list):
+        return [
+            self._recursive_create_widget_items(self.topics_tree_widget, topic_name, topic_type)
+            for topic_name, topic_type in topic_list]
+
+    def _remove_topics(self, topic_names):
+        topics = []
+        for topic_name in topic_names:
+            topic = self._topics.pop(topic_name)
+            topic['info'].stop_monitoring()
+            self._topic_index.remove_topic(topic_name)
+            topics.append(topic)
+        self._remove_topic_items(topic_names, [topic['item'] for topic in topics])
+
+    def _remove_topic_items(self, topic_names, items):
+        for item in items:
+            self._forget_widget_items(item)
+
+        tree = self.topics_tree_widget
+        if len(items) < 16:
+            for item in items:
+                tree.takeTopLevelItem(tree.indexOfTopLevelItem(item))
+        else:
+            # find all indices in one pass instead of searching for each item
+            topic_names = set(topic_names)
+            indices = [index for index in range(tree.topLevelItemCount())
+                       if tree.topLevelItem(index).data(0, Qt.UserRole) in topic_names]
+            for index in reversed(indices):
+                tree.takeTopLevelItem(index)
+
+    def set_filter_text(self, text):
+        """
+        Show only the topics and fields matching a query.
+
+        @param text: space separated prefixes of the parts of the topic names
+                     and field paths, i.e. 'odom pos', empty to show all rows
+        """
+        self._filter_text = text
+        self._topic_filter = self._topic_index.query(text)
+        tree = self._tree_view
+        tree.setUpdatesEnabled(False)
+        auto_resize = self._suspend_auto_resize()
         try:
-            if self._selected_topics is None:
-                topic_list = rospy.get_published_topics()
-                if topic_list is None:
-                    rospy.logerr(
-                        'Not even a single published topic found. Check network configuration')
-                    return
-            else:  # Topics to show are specified.
-                topic_list = self._selected_topics
-                topic_specifiers_server_all = None
-                topic_specifiers_required = None
-
-                rospy.logdebug('refresh_topics) self._selected_topics=%s' % (topic_list,))
-
-                if self._select_topic_type == self.SELECT_BY_NAME:
-                    topic_specifiers_server_all = \
-                        [name for name, type in rospy.get_published_topics()]
-                    topic_specifiers_required = [name for name, type in topic_list]
-                elif self._select_topic_type == self.SELECT_BY_MSGTYPE:
-                    # The topics that are required (by whoever uses this class).
-                    topic_specifiers_required = [type for name, type in topic_list]
-
-                    # The required topics that match with published topics.
-                    topics_match = [(name, type) for name, type in rospy.get_published_topics()
-                                    if type in topic_specifiers_required]
-                    topic_list = topics_match
-                    rospy.logdebug('selected & published topic types=%s' % (topic_list,))
-
-                rospy.logdebug('server_all=%s\nrequired=%s\ntlist=%s' %
-                               (topic_specifiers_server_all, topic_specifiers_required, topic_list))
-                if len(topic_list) == 0:
-                    rospy.logerr(
-                        'None of the following required topics are found.\n(NAME, TYPE): %s' %
-                        (self._selected_topics,))
-                    return
-        except IOError as e:
-            rospy.logerr("Communication with rosmaster failed: {0}".format(e.strerror))
-            return
+            self._apply_topic_filter()
+        finally:
+            self._resume_auto_resize(auto_resize)
+            tree.setUpdatesEnabled(True)
+        self._schedule_update_visible_values()
 
-        if self._current_topic_list != topic_list:
-            self._current_topic_list = topic_list
-
-            # start new topic dict
-            new_topics = {}
-
-            for topic_name, topic_type in topic_list:
-                # if topic is new or has changed its type
-                if topic_name not in self._topics or \
-                   self._topics[topic_name]['type'] != topic_type:
-                    # create new TopicInfo
-                    topic_info = TopicInfo(topic_name, topic_type)
-                    message_instance = None
-                    if topic_info.message_class is not None:
-                        message_instance = topic_info.message_class()
-                    # add it to the dict and tree view
-                    topic_item = self._recursive_create_widget_items(
-                        self.topics_tree_widget, topic_name, topic_type, message_instance)
-                    new_topics[topic_name] = {
-                        'item': topic_item,
-                        'info': topic_info,
-                        'type': topic_type,
-                    }
-                else:
-                    # if topic has been seen before, copy it to new dict and
-                    # remove it from the old one
-                    new_topics[topic_name] = self._topics[topic_name]
-                    del self._topics[topic_name]
+    @Slot(str)
+    def on_filter_line_edit_textChanged(self, text):
+        self.set_filter_text(text)
 
-            # clean up old topics
-            for topic_name in self._topics.keys():
-                self._topics[topic_name]['info'].stop_monitoring()
-                index = self.topics_tree_widget.indexOfTopLevelItem(
-                    self._topics[topic_name]['item'])
-                self.topics_tree_widget.takeTopLevelItem(index)
+    def _apply_topic_filter(self):
+        # hide the rows instead of removing them
+        topic_filter = self._topic_filter
+        for topic_name, topic in self._topics.items():
+            item = topic['item']
+            hidden = topic_filter is not None and not topic_filter.accepts_topic(topic_name)
+            item.setHidden(hidden)
+            self._apply_field_filter(item, topic_name)
 
-            # switch to new topic dict
-            self._topics = new_topics
+    def _apply_field_filter(self, item, topic_name):
+        for index in range(item.childCount()):
+            child = item.child(index)
+            path = child.data(0, Qt.UserRole)
+            if path is None:
+                # placeholder of an item which has not been expanded yet
+                continue
+            child.setHidden(
+                self._topic_filter is not None and not self._topic_filter.accepts_field(
+                    topic_name, normalize_field_path(path[len(topic_name) + 1:])))
+            self._apply_field_filter(child, topic_name)
 
-        self._update_topics_data()
+    def _suspend_auto_resize(self):
+        """
+        Stop resizing the columns to their contents on every change of an item,
+        which takes time quadratic in the number of rows for a batch of changes.
+
+        @return: whether the columns were resized to their contents
+        """
+        header = self._tree_view.header()
+        try:
+            sectionResizeMode = header.sectionResizeMode  # Qt5
+            setSectionResizeMode = header.setSectionResizeMode  # Qt5
+        except AttributeError:
+            sectionResizeMode = header.resizeMode  # Qt4
+            setSectionResizeMode = header.setResizeMode  # Qt4
+        if sectionResizeMode(0) != QHeaderView.ResizeToContents:
+            return False
+        setSectionResizeMode(QHeaderView.Interactive)
+        return True
+
+    def _resume_auto_resize(self, auto_resize):
+        """
+        Resize the columns once and resume resizing them to their contents.
+
+        @param auto_resize: the result of _suspend_auto_resize()
+        """
+        if auto_resize:
+            header = self._tree_view.header()
+            try:
+                setSectionResizeMode = header.setSectionResizeMode  # Qt5
+            except AttributeError:
+                setSectionResizeMode = header.setResizeMode  # Qt4
+            setSectionResizeMode(QHeaderView.ResizeToContents)
 
     def _update_topics_data(self):
+        self._tick_timer.reset()
+        auto_resize = self._suspend_auto_resize()
+        try:
+            self._update_topic_rows()
+        finally:
+            self._tick_timer.start('resize')
+            self._resume_auto_resize(auto_resize)
+            self._tick_timer.stop()
+        if self._profiling_enabled:
+            self._update_profiling_label()
+        if self._sparkline_delegate.enabled:
+            # the history moves on even if the texts of a row did not change
+            self._tree_view.viewport().update()
+
+    def _update_topic_rows(self):
+        stamp = rospy.get_time()
+        now = clock()
+        samples = []
+        tick_timer = self._tick_timer
+        if not self._monitor_scheduler.is_idle():
+            tick_timer.start('schedule')
+            self._schedule_monitoring(stamp, now)
         for topic in self._topics.values():
             topic_info = topic['info']
+            topic_name = topic_info._topic_name
+            texts = {}
+            sort_data = {}
             if topic_info.monitoring:
-                # update rate
-                rate, _, _, _ = topic_info.get_hz()
-                rate_text = '%1.2f' % rate if rate != None else 'unknown'
-
-                # update bandwidth
-                bytes_per_s, _, _, _ = topic_info.get_bw()
-                if bytes_per_s is None:
-                    bandwidth_text = 'unknown'
-                elif bytes_per_s < 1000:
-                    bandwidth_text = '%.2fB/s' % bytes_per_s
-                elif bytes_per_s < 1000000:
-                    bandwidth_text = '%.2fKB/s' % (bytes_per_s / 1000.)
+                tick_timer.start('statistics')
+                topic_info.fit_buffer_size()
+                statistics = get_topic_statistics(topic_name, topic['type'], topic_info, stamp)
+                samples.append(statistics)
+                self._get_statistics_data(statistics, texts, sort_data)
+                if statistics['latency'] is not None and self._percentile_window is not None:
+                    latencies = topic_info.get_latency_percentiles(
+                        self._percentile_window, [95])
+                    if latencies is not None:
+                        texts['latency'] += ' (p95 %.2fms)' % (latencies[0] * 1000.)
+                if topic_info.future_stamp_count:
+                    # the latencies are meaningless if the clocks are not in sync
+                    texts['latency'] += ' (%d stamped ahead of the clock)' % \
+                        topic_info.future_stamp_count
+
+                if self._percentile_window is not None:
+                    self._get_percentile_data(topic_info, texts, sort_data)
+                if self._profiling_enabled:
+                    self._get_profiling_data(topic, texts, sort_data)
+                if self._monitor_scheduler.is_scheduled(topic_name):
+                    texts['sampled'] = 'live'
+                    sort_data['sampled'] = 0.
+                tick_timer.start('publishers')
+                self._set_publisher_rows(
+                    topic_name, self._get_publisher_rows(topic_info, stamp))
+
+                # update values, only if a message arrived since the last update
+                tick_timer.start('values')
+                texts['value'] = ''
+                message = topic_info.take_display_message()
+                if message is not None:
+                    self.update_value(topic_name, message)
+
+            else:
+                texts['value'] = \
+                    'not monitored' if topic_info.error is None else topic_info.error
+                topic.pop('profile', None)
+                for column_name in self._percentile_column_names + self._profiling_column_names:
+                    texts[column_name] = ''
+                    sort_data[column_name] = None
+                # scheduled topics show the statistics of their last turn
+                sample, age = self._monitor_scheduler.get_sample(topic_name, now)
+                if sample is not None:
+                    self._get_statistics_data(sample, texts, sort_data)
+                    texts['value'] = 'waiting for the next turn'
+                else:
+                    self._get_statistics_data({}, texts, sort_data, '')
+                if self._monitor_scheduler.is_scheduled(topic_name):
+                    texts['sampled'] = 'waiting' if age is None else '%d s ago' % age
+                    sort_data['sampled'] = age
                 else:
-                    bandwidth_text = '%.2fMB/s' % (bytes_per_s / 1000000.)
+                    texts['sampled'] = ''
+                    sort_data['sampled'] = None
+                self._set_publisher_rows(topic_name, [])
 
-                # update values
-                value_text = ''
-                self.update_value(topic_info._topic_name, topic_info.last_message)
+            tick_timer.start('rows')
+            self._set_topic_row(topic_name, texts, sort_data)
+
+        if self._statistics_writer is not None:
+            self._statistics_writer.write(samples)
+
+    def _get_statistics_data(self, statistics, texts, sort_data, unknown_text='unknown'):
+        """
+        @param statistics: dict as returned by get_topic_statistics()
+        @param unknown_text: text of the rate and bandwidth if they are not known
+        """
+        # update rate
+        rate = statistics.get('hz')
+        rate_text = '%1.2f' % rate if rate != None else unknown_text
+        # the rate only counts the messages which did not overflow the queue
+        if statistics.get('overflow'):
+            rate_text += ' (%d overflowed)' % statistics['overflow']
+
+        # update bandwidth
+        bytes_per_s = statistics.get('bw')
+        if bytes_per_s is None:
+            bandwidth_text = unknown_text
+        elif bytes_per_s < 1000:
+            bandwidth_text = '%.2fB/s' % bytes_per_s
+        elif bytes_per_s < 1000000:
+            bandwidth_text = '%.2fKB/s' % (bytes_per_s / 1000.)
+        else:
+            bandwidth_text = '%.2fMB/s' % (bytes_per_s / 1000000.)
 
+        # update latency from the header stamp to the receipt
+        latency = statistics.get('latency')
+        latency_text = '' if latency is None else '%.2fms' % (latency * 1000.)
+
+        texts.update({'rate': rate_text, 'bandwidth': bandwidth_text, 'latency': latency_text})
+        sort_data.update({'bandwidth': bytes_per_s, 'rate': rate, 'latency': latency})
+
+    def _get_publisher_rows(self, topic_info, stamp):
+        """
+        @return: list of (callerid, text by column name) of the publishers of the topic
+        """
+        rows = []
+        for publisher in topic_info.get_publishers():
+            texts = {}
+            self._get_statistics_data(
+                {'hz': publisher.get_rate(stamp), 'bw': publisher.get_bandwidth(stamp)},
+                texts, {})
+            if publisher.numbered:
+                texts['value'] = '%d dropped, %d reordered' % (
+                    publisher.dropped, publisher.reordered)
             else:
-                rate_text = ''
-                bytes_per_s = None
-                bandwidth_text = ''
-                value_text = 'not monitored' if topic_info.error is None else topic_info.error
-
-            self._tree_items[topic_info._topic_name].setText(self._column_index['rate'], rate_text)
-            self._tree_items[topic_info._topic_name].setData(
-                self._column_index['bandwidth'], Qt.UserRole, bytes_per_s)
-            self._tree_items[topic_info._topic_name].setText(
-                self._column_index['bandwidth'], bandwidth_text)
-            self._tree_items[topic_info._topic_name].setText(
-                self._column_index['value'], value_text)
+                texts['value'] = '%d messages' % publisher.message_count
+            rows.append((publisher.callerid, texts))
+        return rows
+
+    def _set_publisher_rows(self, topic_name, rows):
+        """
+        Show a child row below the topic for each of its publishers.
+
+        @param rows: list of (callerid, text by column name) as returned by
+                     _get_publisher_rows()
+        """
+        topic = self._topics[topic_name]
+        items = topic['publisher_items']
+        if not rows and not items:
+            return
+        topic_item = topic['item']
+        callerids = set(callerid for callerid, _ in rows)
+        for callerid in list(items.keys()):
+            if callerid not in callerids:
+                topic_item.removeChild(items.pop(callerid))
+        for callerid, texts in rows:
+            item = items.get(callerid)
+            if item is None:
+                item = items[callerid] = QTreeWidgetItem(topic_item)
+                item.setText(self._column_index['topic'], callerid)
+                item.setText(self._column_index['type'], 'publisher')
+            for column_name, text in texts.items():
+                column = self._column_index[column_name]
+                if item.text(column) != text:
+                    item.setText(column, text)
+
+    def _schedule_monitoring(self, stamp, now):
+        monitored = set(
+            topic_name for topic_name, topic in self._topics.items()
+            if topic['info'].monitoring)
+
+        def get_bandwidth(topic_name):
+            return self._topics[topic_name]['info'].get_bw()[0]
+
+        start, stop = self._monitor_scheduler.update(
+            list(self._topics.keys()), monitored, get_bandwidth, now)
+        for topic_name in stop:
+            topic = self._topics.get(topic_name)
+            if topic is None:
+                continue
+            self._monitor_scheduler.record_sample(
+                topic_name,
+                get_topic_statistics(topic_name, topic['type'], topic['info'], stamp), now)
+            self._set_topic_monitored(topic_name, False)
+        for topic_name in start:
+            self._set_topic_monitored(topic_name, True)
+
+    def _set_topic_monitored(self, topic_name, monitored):
+        self._tree_items[topic_name].setCheckState(0, Qt.Checked if monitored else Qt.Unchecked)
+
+    def set_monitor_patterns(self, patterns, max_subscriptions=None, max_bandwidth=None,
+                             dwell_time=None):
+        """
+        Monitor the topics matching patterns, taking turns if there are too many.
+
+        @param patterns: list of globs like /sensors/** or regular expressions
+                         prefixed with re:, an empty list stops scheduling
+        @param max_subscriptions: number of topics monitored at once
+        @param max_bandwidth: total bandwidth in bytes per second, 0 for no limit
+        @param dwell_time: seconds a topic is monitored before making room for others
+        @raise re.error: if one of the regular expressions is invalid
+        """
+        scheduler = self._monitor_scheduler
+        scheduler.set_patterns(patterns)
+        if max_subscriptions is not None:
+            scheduler.max_subscriptions = max(1, int(max_subscriptions))
+        if max_bandwidth is not None:
+            scheduler.max_bandwidth = max_bandwidth or None
+        if dwell_time is not None:
+            scheduler.dwell_time = max(0., dwell_time)
+        self._tree_view.setColumnHidden(self._column_index['sampled'], not patterns)
+
+    def edit_monitor_patterns(self):
+        """
+        Let the user choose the patterns of topics to monitor and the budget in a dialog.
+        """
+        scheduler = self._monitor_scheduler
+        dialog = QDialog(self)
+        dialog.setWindowTitle('Monitor Topics by Pattern')
+        layout = QFormLayout(dialog)
+        patterns_edit = QLineEdit(' '.join(scheduler.patterns), dialog)
+        patterns_edit.setToolTip(
+            'Space separated globs like /sensors/** where * and ? do not match "/" '
+            'but ** does, or regular expressions prefixed with "re:"')
+        layout.addRow('Patterns', patterns_edit)
+        subscriptions_spin_box = QSpinBox(dialog)
+        subscriptions_spin_box.setRange(1, 10000)
+        subscriptions_spin_box.setValue(scheduler.max_subscriptions)
+        layout.addRow('Topics monitored at once', subscriptions_spin_box)
+        bandwidth_spin_box = QDoubleSpinBox(dialog)
+        bandwidth_spin_box.setRange(0., 100000.)
+        bandwidth_spin_box.setSuffix(' MB/s')
+        bandwidth_spin_box.setSpecialValueText('unlimited')
+        bandwidth_spin_box.setValue((scheduler.max_bandwidth or 0.) / 1000000.)
+        layout.addRow('Bandwidth budget', bandwidth_spin_box)
+        dwell_spin_box = QDoubleSpinBox(dialog)
+        dwell_spin_box.setRange(0.5, 3600.)
+        dwell_spin_box.setSuffix(' s')
+        dwell_spin_box.setValue(scheduler.dwell_time)
+        layout.addRow('Time per turn', dwell_spin_box)
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel, parent=dialog)
+        buttons.accepted.connect(dialog.accept)
+        buttons.rejected.connect(dialog.reject)
+        layout.addRow(buttons)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        try:
+            self.set_monitor_patterns(
+                patterns_edit.text().split(), subscriptions_spin_box.value(),
+                bandwidth_spin_box.value() * 1000000., dwell_spin_box.value())
+        except re.error as e:
+            QMessageBox.warning(self, 'Invalid Pattern', 'Invalid regular expression: %s' % e)
+
+    def _get_history(self, index):
+        topic = self._topics.get(index.sibling(index.row(), 0).data(Qt.UserRole))
+        if topic is None or not topic['info'].monitoring:
+            return None
+        if index.column() == self._column_index['rate']:
+            return topic['info'].get_rate_history()
+        return topic['info'].get_bandwidth_history()
+
+    def set_history_enabled(self, enabled):
+        """
+        @param enabled: whether to draw the rate and bandwidth history as sparklines
+        """
+        self._sparkline_delegate.enabled = enabled
+        # the width of the columns depends on the sparklines
+        self._tree_view.doItemsLayout()
+
+    def _get_percentile_data(self, topic_info, texts, sort_data):
+        intervals = topic_info.get_interval_percentiles(
+            self._percentile_window, self._percentiles)
+        for column_name, interval in zip(
+                self._percentile_column_names, intervals or [None] * len(self._percentiles)):
+            texts[column_name] = '' if interval is None else '%.2fms' % (interval * 1000.)
+            sort_data[column_name] = interval
+
+    def set_percentile_window(self, window):
+        """
+        Show the percentiles of the inter-arrival times of messages over a time window.
+
+        @param window: duration in seconds, one of TopicInfo.PERCENTILE_WINDOWS,
+                       or None to hide the percentile columns
+        """
+        self._percentile_window = window
+        for column_name, percentile in zip(self._percentile_column_names, self._percentiles):
+            column = self._column_index[column_name]
+            self._tree_view.setColumnHidden(column, window is None)
+            if window is not None:
+                self._set_header_label(column, 'p%d (%g s)' % (percentile, window))
+
+    def _set_header_label(self, column, text):
+        self.topics_tree_widget.headerItem().setText(column, text)
+
+    def _get_profiling_data(self, topic, texts, sort_data):
+        topic_info = topic['info']
+        # the share of CPU time spent in the callback since the last update
+        now = clock()
+        callback_time = topic_info.callback_time
+        previous_time, previous_callback_time, _ = topic.get('profile', (None, None, None))
+        load = None
+        if previous_time is not None and now > previous_time:
+            load = max(0., callback_time - previous_callback_time) / (now - previous_time)
+        topic['profile'] = (now, callback_time, load)
+        texts['callback'] = '' if load is None else '%.2f%%' % (load * 100.)
+        sort_data['callback'] = load
+        queue_depth = topic_info.get_queue_depth()
+        texts['queue'] = '' if queue_depth is None else str(queue_depth)
+        sort_data['queue'] = queue_depth
+
+    def set_profiling_enabled(self, enabled):
+        """
+        Show or hide the columns and the status line reporting the overhead of monitoring.
+        """
+        self._profiling_enabled = enabled
+        for column_name in self._profiling_column_names:
+            self._tree_view.setColumnHidden(self._column_index[column_name], not enabled)
+        self._profiling_label.setVisible(enabled)
+        if not enabled:
+            for topic in self._topics.values():
+                topic.pop('profile', None)
+
+    def _update_profiling_label(self):
+        monitored = [topic for topic in self._topics.values() if topic['info'].monitoring]
+        load = sum(topic['profile'][2] or 0. for topic in monitored if 'profile' in topic)
+        lock_wait_time = sum(topic['info'].lock_wait_time for topic in monitored)
+        message_count = sum(topic['info'].message_count for topic in monitored)
+        discovery_duration = self._topic_discovery.last_query_duration
+        texts = [
+            'Statistics update every %d ms: %s' % (
+                self._timer_update_topics_data.current_interval(), self._tick_timer.format()),
+            'Topic discovery: query %s, apply %s, startup %s' % (
+                '-' if discovery_duration is None else '%.1f ms' % (discovery_duration * 1000.),
+                '-' if self._discovery_apply_duration is None else
+                '%.1f ms' % (self._discovery_apply_duration * 1000.),
+                '-' if self._startup_duration is None else
+                '%.1f ms' % (self._startup_duration * 1000.)),
+            'Callbacks of %d monitored topics: %.2f%% CPU, %d messages, lock wait %.1f us/message'
+            % (len(monitored), load * 100.,
+               message_count, lock_wait_time / message_count * 1e6 if message_count else 0.),
+        ]
+        self._profiling_label.setText('\n'.join(texts))
+
+    def start_statistics_export(self, path):
+        """
+        Append the statistics of the monitored topics to a file on every update.
+
+        @param path: CSV file if it ends with .csv, JSON lines file otherwise
+        """
+        self.stop_statistics_export()
+        self._statistics_writer = StatisticsWriter(path)
+
+    def stop_statistics_export(self):
+        if self._statistics_writer is not None:
+            self._statistics_writer.close()
+            self._statistics_writer = None
+
+    def _set_topic_row(self, topic_name, texts, sort_data):
+        """
+        @param texts: text by column name
+        @param sort_data: data to sort by, by column name
+        """
+        item = self._tree_items[topic_name]
+        for column_name, value in sort_data.items():
+            item.setData(self._column_index[column_name], Qt.UserRole, value)
+        for column_name, text in texts.items():
+            item.setText(self._column_index[column_name], text)
 
     def update_value(self, topic_name, message):
+        """
+        update the value column of the visible rows of the message
+        """
+        if topic_name in self._pending_children:
+            # child items are created and updated once the item is expanded
+            return
+
         if hasattr(message, '__slots__') and hasattr(message, '_slot_types'):
+            if not self._tree_items[topic_name].isExpanded():
+                return
             for slot_name in message.__slots__:
                 self.update_value(topic_name + '/' + slot_name, getattr(message, slot_name))
 
@@ -246,6 +875,11 @@ class TopicWidget(QWidget):
                 (len(message) > 0) and \
                 hasattr(message[0], '__slots__'):
 
+            if not self._tree_items[topic_name].isExpanded():
+                # element items are created or removed once the item is expanded
+                self._tree_items[topic_name].setChildIndicatorPolicy(
+                    QTreeWidgetItem.ShowIndicator)
+                return
             for index, slot in enumerate(message):
                 if topic_name + '[%d]' % index in self._tree_items:
                     self.update_value(topic_name + '[%d]' % index, slot)
@@ -254,29 +888,40 @@ class TopicWidget(QWidget):
                         self._tree_items[topic_name].text(self._column_index['type']))
                     self._recursive_create_widget_items(
                         self._tree_items[topic_name],
-                        topic_name + '[%d]' % index, base_type_str, slot)
+                        topic_name + '[%d]' % index, base_type_str)
             # remove obsolete children
             if len(message) < self._tree_items[topic_name].childCount():
                 for i in range(len(message), self._tree_items[topic_name].childCount()):
                     item_topic_name = topic_name + '[%d]' % i
                     self._recursive_delete_widget_items(self._tree_items[item_topic_name])
         else:
-            if topic_name in self._tree_items:
-                self._tree_items[topic_name].setText(self._column_index['value'], repr(message))
+            item = self._tree_items.get(topic_name)
+            if item is not None and self._is_item_visible(item):
+                value_text = self._value_renderer.render(
+                    topic_name, message, item.text(self._column_index['type']))
+                item.setText(self._column_index['value'], value_text)
 
-    def _extract_array_info(self, type_str):
-        array_size = None
-        if '[' in type_str and type_str[-1] == ']':
-            type_str, array_size_str = type_str.split('[', 1)
-            array_size_str = array_size_str[:-1]
-            if len(array_size_str) > 0:
-                array_size = int(array_size_str)
-            else:
-                array_size = 0
+    def _is_item_visible(self, item):
+        rect = self.topics_tree_widget.visualItemRect(item)
+        return rect.isValid() and rect.intersects(self.topics_tree_widget.viewport().rect())
 
-        return type_str, array_size
+    @Slot()
+    def _schedule_update_visible_values(self):
+        # coalesce consecutive scroll and expand events
+        if not self._timer_update_visible_values.isActive():
+            self._timer_update_visible_values.start(0)
+
+    @Slot()
+    def _update_visible_values(self):
+        for topic in self._topics.values():
+            topic_info = topic['info']
+            if topic_info.monitoring and topic_info.last_message is not None:
+                self.update_value(topic_info._topic_name, topic_info.last_message)
 
-    def _recursive_create_widget_items(self, parent, topic_name, type_name, message):
+    def _extract_array_info(self, type_str):
+        return parse_array_type(type_str)
+
+    def _recursive_create_widget_items(self, parent, topic_name, type_name):
         if parent is self.topics_tree_widget:
             # show full topic name with preceding namespace on toplevel item
             topic_text = topic_name
@@ -286,54 +931,140 @@ class TopicWidget(QWidget):
             if '[' in topic_text:
                 topic_text = topic_text[topic_text.index('['):]
             item = QTreeWidgetItem(parent)
+            if self._topic_filter is not None:
+                root = item
+                while root.parent() is not None:
+                    root = root.parent()
+                root_topic_name = root.data(0, Qt.UserRole)
+                item.setHidden(not self._topic_filter.accepts_field(
+                    root_topic_name,
+                    normalize_field_path(topic_name[len(root_topic_name) + 1:])))
         item.setText(self._column_index['topic'], topic_text)
         item.setText(self._column_index['type'], type_name)
         item.setData(0, Qt.UserRole, topic_name)
         self._tree_items[topic_name] = item
-        if hasattr(message, '__slots__') and hasattr(message, '_slot_types'):
-            for slot_name, type_name in zip(message.__slots__, message._slot_types):
+        # the layout of a topic type is only loaded once the item is expanded,
+        # loading the message classes of all topics would delay showing them
+        if parent is self.topics_tree_widget or self._has_child_items(type_name):
+            # defer creating the child items until the item is expanded,
+            # a placeholder child keeps the expand indicator visible
+            self._pending_children[topic_name] = type_name
+            QTreeWidgetItem(item)
+        return item
+
+    def _has_child_items(self, type_name):
+        base_type_str, array_size = self._extract_array_info(type_name)
+        layout = get_message_layout(base_type_str)
+        if layout is None or not layout.fields:
+            return False
+        # elements of variable-length arrays are added by update_value()
+        return array_size is None or array_size > 0
+
+    def _create_child_widget_items(self, item, topic_name):
+        type_name = self._pending_children.pop(topic_name)
+        # remove placeholder and publisher items, the latter are added again below
+        item.takeChildren()
+        base_type_str, array_size = self._extract_array_info(type_name)
+        if array_size is None:
+            layout = get_message_layout(type_name)
+            for field in layout.fields if layout is not None else ():
                 self._recursive_create_widget_items(
-                    item, topic_name + '/' + slot_name, type_name, getattr(message, slot_name))
+                    item, topic_name + '/' + field.name, field.type_name)
 
         else:
-            base_type_str, array_size = self._extract_array_info(type_name)
-            try:
-                base_instance = roslib.message.get_message_class(base_type_str)()
-            except (ValueError, TypeError):
-                base_instance = None
-            if array_size is not None and hasattr(base_instance, '__slots__'):
-                for index in range(array_size):
-                    self._recursive_create_widget_items(
-                        item, topic_name + '[%d]' % index, base_type_str, base_instance)
-        return item
+            for index in range(array_size):
+                self._recursive_create_widget_items(
+                    item, topic_name + '[%d]' % index, base_type_str)
+
+        topic = self._topics.get(topic_name)
+        if topic is not None and topic['publisher_items']:
+            item.addChildren(list(topic['publisher_items'].values()))
+
+    @Slot('QTreeWidgetItem*')
+    def _handle_item_expanded(self, item):
+        topic_name = item.data(0, Qt.UserRole)
+        if topic_name in self._pending_children:
+            self._create_child_widget_items(item, topic_name)
+        self._schedule_update_visible_values()
 
     def _toggle_monitoring(self, topic_name):
         item = self._tree_items[topic_name]
         if item.checkState(0):
-            self._topics[topic_name]['info'].start_monitoring()
+            if not self._topics[topic_name]['info'].start_monitoring():
+                # the message class can not be loaded, the row shows the error
+                item.setCheckState(0, Qt.Unchecked)
         else:
             self._topics[topic_name]['info'].stop_monitoring()
+            self._value_renderer.forget(topic_name)
 
     def _recursive_delete_widget_items(self, item):
+        self._forget_widget_items(item)
+        item.parent().removeChild(item)
+
+    def _forget_widget_items(self, item):
         def _recursive_remove_items_from_tree(item):
             for index in reversed(range(item.childCount())):
                 _recursive_remove_items_from_tree(item.child(index))
             topic_name = item.data(0, Qt.UserRole)
+            if topic_name is None:
+                # placeholder of an item which has not been expanded yet
+                return
             del self._tree_items[topic_name]
+            self._pending_children.pop(topic_name, None)
         _recursive_remove_items_from_tree(item)
-        item.parent().removeChild(item)
+        self._value_renderer.forget(item.data(0, Qt.UserRole))
 
     @Slot('QPoint')
     def handle_header_view_customContextMenuRequested(self, pos):
-        header = self.topics_tree_widget.header()
+        header = self._tree_view.header()
 
         # show context menu
         menu = QMenu(self)
         action_toggle_auto_resize = menu.addAction('Toggle Auto-Resize')
+        action_monitor_patterns = menu.addAction('Monitor by Pattern...')
+        action_toggle_history = menu.addAction('Show Rate History')
+        action_toggle_history.setCheckable(True)
+        action_toggle_history.setChecked(self._sparkline_delegate.enabled)
+        action_toggle_profiling = menu.addAction('Show Profiling')
+        action_toggle_profiling.setCheckable(True)
+        action_toggle_profiling.setChecked(self._profiling_enabled)
+        percentile_menu = menu.addMenu('Inter-Arrival Percentiles')
+        percentile_actions = {}
+        for window in (None,) + TopicInfo.PERCENTILE_WINDOWS:
+            percentile_action = percentile_menu.addAction(
+                'Hidden' if window is None else 'Last %g s' % window)
+            percentile_action.setCheckable(True)
+            percentile_action.setChecked(window == self._percentile_window)
+            percentile_actions[percentile_action] = window
+        menu.addSeparator()
+        if self._statistics_writer is None:
+            action_export = menu.addAction(
+                QIcon.fromTheme('document-save-as'), 'Export Statistics...')
+        else:
+            action_export = menu.addAction(
+                QIcon.fromTheme('process-stop'),
+                'Stop Exporting Statistics to %s' % os.path.basename(self._statistics_writer.path))
         action = menu.exec_(header.mapToGlobal(pos))
 
         # evaluate user action
-        if action is action_toggle_auto_resize:
+        if action is action_export:
+            if self._statistics_writer is not None:
+                self.stop_statistics_export()
+            else:
+                path, _ = QFileDialog.getSaveFileName(
+                    self, 'Export Statistics', 'rqt_topic_statistics.csv',
+                    'CSV files (*.csv);;JSON lines files (*.jsonl)')
+                if path:
+                    self.start_statistics_export(path)
+        elif action is action_monitor_patterns:
+            self.edit_monitor_patterns()
+        elif action in percentile_actions:
+            self.set_percentile_window(percentile_actions[action])
+        elif action is action_toggle_history:
+            self.set_history_enabled(not self._sparkline_delegate.enabled)
+        elif action is action_toggle_profiling:
+            self.set_profiling_enabled(not self._profiling_enabled)
+        elif action is action_toggle_auto_resize:
             try:
                 sectionResizeMode = header.sectionResizeMode  # Qt5
                 setSectionResizeMode = header.setSectionResizeMode  # Qt5
@@ -351,26 +1082,37 @@ class TopicWidget(QWidget):
         if item is None:
             return
 
+        expanded = self._exec_item_context_menu(pos)
+        if expanded is not None:
+            def recursive_set_expanded(item):
+                item.setExpanded(expanded)
+                for index in range(item.childCount()):
+                    recursive_set_expanded(item.child(index))
+            recursive_set_expanded(item)
+
+    def _exec_item_context_menu(self, pos):
+        """
+        @return: True to expand or False to collapse all children, None otherwise
+        """
         # show context menu
         menu = QMenu(self)
         action_item_expand = menu.addAction(QIcon.fromTheme('zoom-in'), 'Expand All Children')
         action_item_collapse = menu.addAction(QIcon.fromTheme('zoom-out'), 'Collapse All Children')
-        action = menu.exec_(self.topics_tree_widget.mapToGlobal(pos))
+        action = menu.exec_(self._tree_view.mapToGlobal(pos))
 
         # evaluate user action
         if action in (action_item_expand, action_item_collapse):
-            expanded = (action is action_item_expand)
-
-            def recursive_set_expanded(item):
-                item.setExpanded(expanded)
-                for index in range(item.childCount()):
-                    recursive_set_expanded(item.child(index))
-            recursive_set_expanded(item)
+            return action is action_item_expand
+        return None
 
     def shutdown_plugin(self):
         for topic in self._topics.values():
             topic['info'].stop_monitoring()
-        self._timer_refresh_topics.stop()
+        self._timer_discover_topics.stop()
+        self._timer_update_topics_data.stop()
+        self._timer_update_visible_values.stop()
+        self._topic_discovery.shutdown()
+        self.stop_statistics_export()
 
     def set_selected_topics(self, selected_topics):
         """
@@ -382,14 +1124,61 @@ class TopicWidget(QWidget):
 
     # TODO(Enhancement) Save/Restore tree expansion state
     def save_settings(self, plugin_settings, instance_settings):
-        header_state = self.topics_tree_widget.header().saveState()
+        plugin_settings.set_value('queue_size', self.subscriber_queue_size())
+        header_state = self._tree_view.header().saveState()
         instance_settings.set_value('tree_widget_header_state', header_state)
+        for key, interval in zip(self._interval_settings, self.refresh_intervals()):
+            instance_settings.set_value(key, interval)
+        instance_settings.set_value('show_profiling', self._profiling_enabled)
+        instance_settings.set_value('show_history', self._sparkline_delegate.enabled)
+        instance_settings.set_value('percentile_window', self._percentile_window or 0)
+        scheduler = self._monitor_scheduler
+        instance_settings.set_value('monitor_patterns', ' '.join(scheduler.patterns))
+        instance_settings.set_value('monitor_max_subscriptions', scheduler.max_subscriptions)
+        instance_settings.set_value('monitor_max_bandwidth', scheduler.max_bandwidth or 0)
+        instance_settings.set_value('monitor_dwell_time', scheduler.dwell_time)
+        instance_settings.set_value('filter_text', self._filter_text)
 
     def restore_settings(self, pluggin_settings, instance_settings):
         if instance_settings.contains('tree_widget_header_state'):
             header_state = instance_settings.value('tree_widget_header_state')
-            if not self.topics_tree_widget.header().restoreState(header_state):
+            if not self._tree_view.header().restoreState(header_state):
                 rospy.logwarn("rqt_topic: Failed to restore header state.")
+        try:
+            intervals = [
+                int(instance_settings.value(key, interval))
+                for key, interval in zip(self._interval_settings, self.refresh_intervals())]
+        except (TypeError, ValueError):
+            rospy.logwarn("rqt_topic: Failed to restore refresh intervals.")
+        else:
+            self.set_refresh_intervals(*intervals)
+        try:
+            self.set_subscriber_queue_size(
+                int(pluggin_settings.value('queue_size', self.subscriber_queue_size())))
+        except (TypeError, ValueError):
+            rospy.logwarn("rqt_topic: Failed to restore the subscriber queue size.")
+        # the header state also contains the visibility of the profiling columns
+        self.set_profiling_enabled(
+            instance_settings.value('show_profiling', False) in [True, 'true'])
+        self.set_history_enabled(instance_settings.value('show_history', True) in [True, 'true'])
+        try:
+            percentile_window = float(instance_settings.value('percentile_window', 0))
+        except (TypeError, ValueError):
+            percentile_window = 0
+        self.set_percentile_window(
+            percentile_window if percentile_window in TopicInfo.PERCENTILE_WINDOWS else None)
+        scheduler = self._monitor_scheduler
+        try:
+            self.set_monitor_patterns(
+                (instance_settings.value('monitor_patterns', '') or '').split(),
+                int(instance_settings.value(
+                    'monitor_max_subscriptions', scheduler.max_subscriptions)),
+                float(instance_settings.value('monitor_max_bandwidth', 0)),
+                float(instance_settings.value('monitor_dwell_time', scheduler.dwell_time)))
+        except (TypeError, ValueError, re.error):
+            rospy.logwarn("rqt_topic: Failed to restore the monitor patterns.")
+        # also filters the rows by the text
+        self.filter_line_edit.setText(instance_settings.value('filter_text', '') or '')
 
 
 class TreeWidgetItem(QTreeWidgetItem):
@@ -409,6 +1198,11 @@ class TreeWidgetItem(QTreeWidgetItem):
 
     def __lt__(self, other_item):
         column = self.treeWidget().sortColumn()
-        if column == TopicWidget._column_names.index('bandwidth'):
-            return self.data(column, Qt.UserRole) < other_item.data(column, Qt.UserRole)
+        if TopicWidget._column_names[column] in TopicWidget._sort_by_data_columns:
+            data = self.data(column, Qt.UserRole)
+            other_data = other_item.data(column, Qt.UserRole)
+            # rows without data, e.g. of topics not monitored, sort first
+            if data is None or other_data is None:
+                return data is None and other_data is not None
+            return data < other_data
         return super(TreeWidgetItem, self).__lt__(other_item)
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2011, Dorian Scholz, TU Darmstadt
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#   * Neither the name of the TU Darmstadt nor the names of its
+#     contributors may be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+from __future__ import division
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+_byte_sequence_types = (bytes, bytearray)
+_numeric_types = (int, float)
+try:
+    _numeric_types += (long,)
+except NameError:
+    pass
+
+
+class ValueRenderer(object):
+
+    """
+    Renders field values to bounded strings for the value column.
+
+    Large sequences, e.g. the data of images or point clouds, are summarized by
+    their length, element type, first and last elements and optionally min, max
+    and mean. The rendered text of sequences is cached per field until the field
+    holds a different value, i.e. a new message has been received.
+    """
+
+    def __init__(self, max_length=256, max_elements=16, edge_elements=3,
+                 with_statistics=True):
+        """
+        @param max_length: maximum length of the rendered text
+        @param max_elements: sequences with more elements are summarized
+        @param edge_elements: number of elements shown at both ends of summaries
+        @param with_statistics: add min, max and mean of numeric sequences to summaries
+        """
+        self.max_length = max_length
+        self.max_elements = max_elements
+        self.edge_elements = edge_elements
+        self.with_statistics = with_statistics
+        # field path -> (value, text)
+        self._cache = {}
+
+    def render(self, field_path, value, type_name=''):
+        """
+        @param field_path: key used to cache the rendered text
+        @param value: field value
+        @param type_name: ROS type of the field, i.e. 'uint8[]'
+        @return: rendered text
+        """
+        if not isinstance(value, (list, tuple) + _byte_sequence_types) and \
+                not hasattr(value, '__len__'):
+            return self._truncate(repr(value))
+        cached = self._cache.get(field_path)
+        if cached is not None and cached[0] is value:
+            return cached[1]
+        text = self._render_sequence(value, type_name)
+        self._cache[field_path] = (value, text)
+        return text
+
+    def forget(self, field_path):
+        """
+        drop the cached text of the field and all its subfields
+        """
+        for path in [path for path in self._cache if
+                     path == field_path or path.startswith(field_path + '/') or
+                     path.startswith(field_path + '[')]:
+            del self._cache[path]
+
+    def clear(self):
+        self._cache.clear()
+
+    def _render_sequence(self, value, type_name):
+        if isinstance(value, str) and not type_name.endswith(']'):
+            # strings are not summarized but only truncated
+            return self._truncate(repr(value[:self.max_length]))
+        if len(value) <= self.max_elements:
+            return self._truncate(repr(value))
+
+        base_type = type_name.split('[', 1)[0] if type_name else type(value).__name__
+        edge = self.edge_elements
+        head = ', '.join(repr(element) for element in value[:edge])
+        tail = ', '.join(repr(element) for element in value[-edge:])
+        text = '%s[%d]: [%s, ..., %s]' % (base_type, len(value), head, tail)
+        if self.with_statistics:
+            statistics = self._statistics(value)
+            if statistics is not None:
+                text += ' min=%r max=%r mean=%.4g' % statistics
+        return self._truncate(text)
+
+    def _statistics(self, value):
+        if isinstance(value, _byte_sequence_types):
+            if numpy is not None:
+                array = numpy.frombuffer(value, dtype=numpy.uint8)
+                return int(array.min()), int(array.max()), float(array.mean())
+            value = bytearray(value)
+        elif numpy is not None and isinstance(value, numpy.ndarray):
+            if value.dtype.kind not in 'biuf':
+                return None
+            return value.min().item(), value.max().item(), float(value.mean())
+        elif not isinstance(value[0], _numeric_types):
+            return None
+        elif numpy is not None:
+            try:
+                array = numpy.asarray(value)
+            except (TypeError, ValueError):
+                return None
+            if array.dtype.kind not in 'biuf':
+                return None
+            return array.min().item(), array.max().item(), float(array.mean())
+        try:
+            return min(value), max(value), sum(value) / len(value)
+        except TypeError:
+            return None
+
+    def _truncate(self, text):
+        if len(text) > self.max_length:
+            text = text[:self.max_length - 3] + '...'
+        return text
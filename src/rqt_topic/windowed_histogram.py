@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2011, Dorian Scholz, TU Darmstadt
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#   * Neither the name of the TU Darmstadt nor the names of its
+#     contributors may be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+from __future__ import division
+import copy
+import math
+
+
+class WindowedHistogram(object):
+
+    """
+    Percentiles of values over sliding time windows with bounded memory.
+
+    Values are counted in logarithmic buckets, so a percentile is accurate
+    to the relative bucket width, about 3% with 40 buckets per decade. Each
+    window is covered by a ring of time slots holding the counts of the
+    values added during the slot. A query merges the slots of the window,
+    which therefore covers between window and window minus one slot.
+    """
+
+    def __init__(self, windows=(1., 10., 60.), slots_per_window=10, min_value=1e-6,
+                 buckets_per_decade=40):
+        """
+        @param windows: durations of the windows in seconds
+        @param slots_per_window: number of time slots each window is divided into
+        @param min_value: upper bound of the lowest bucket, which also holds all smaller values
+        """
+        super(WindowedHistogram, self).__init__()
+        self.windows = tuple(windows)
+        self._slot_count = slots_per_window
+        self._slot_durations = [window / slots_per_window for window in self.windows]
+        self._min_value = min_value
+        self._buckets_per_decade = buckets_per_decade
+        # per window a ring of (slot index, {bucket: count}) or None
+        self._rings = [[None] * slots_per_window for _ in self.windows]
+
+    def clear(self):
+        self._rings = [[None] * self._slot_count for _ in self.windows]
+
+    def copy(self):
+        """
+        Copy the counts, so the percentiles can be computed from the copy while
+        values are added to the original.
+
+        @return: WindowedHistogram
+        """
+        histogram = copy.copy(self)
+        histogram._rings = [
+            [None if slot is None else (slot[0], dict(slot[1])) for slot in ring]
+            for ring in self._rings]
+        return histogram
+
+    def add(self, value, current_time):
+        """
+        @param current_time: time in seconds at which the value was observed
+        """
+        if value > self._min_value:
+            bucket = int(math.log10(value / self._min_value) * self._buckets_per_decade) + 1
+        else:
+            bucket = 0
+        for ring, slot_duration in zip(self._rings, self._slot_durations):
+            slot_index = int(current_time // slot_duration)
+            ring_index = slot_index % self._slot_count
+            slot = ring[ring_index]
+            if slot is None or slot[0] != slot_index:
+                slot = (slot_index, {})
+                ring[ring_index] = slot
+            counts = slot[1]
+            counts[bucket] = counts.get(bucket, 0) + 1
+
+    def percentiles(self, window, percentiles, current_time):
+        """
+        @param window: one of the windows passed to the constructor
+        @param percentiles: ascending sequence of percentiles between 0 and 100
+        @param current_time: end of the window in seconds
+        @return: list of the values at the percentiles, None if the window is empty
+        """
+        index = self.windows.index(window)
+        last_slot_index = int(current_time // self._slot_durations[index])
+        counts = {}
+        for slot in self._rings[index]:
+            if slot is not None and last_slot_index - self._slot_count < slot[0] <= last_slot_index:
+                for bucket, count in slot[1].items():
+                    counts[bucket] = counts.get(bucket, 0) + count
+        total = sum(counts.values())
+        if not total:
+            return None
+
+        values = []
+        buckets = sorted(counts.items())
+        position = 0
+        cumulative = buckets[0][1]
+        for percentile in percentiles:
+            # rank of the value at the percentile, counting from one
+            rank = max(1, int(math.ceil(percentile / 100. * total)))
+            while cumulative < rank and position < len(buckets) - 1:
+                position += 1
+                cumulative += buckets[position][1]
+            values.append(self._bucket_value(buckets[position][0]))
+        return values
+
+    def _bucket_value(self, bucket):
+        if bucket == 0:
+            return self._min_value
+        # geometric center of the bucket
+        return self._min_value * 10 ** ((bucket - .5) / self._buckets_per_decade)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2011, Dorian Scholz, TU Darmstadt
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#   * Neither the name of the TU Darmstadt nor the names of its
+#     contributors may be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import threading
+
+_wire_message_classes = {}
+_materialize_lock = threading.RLock()
+
+
+def get_wire_message_class(message_class):
+    """
+    Return a subclass of message_class which records the size of the serialized
+    message and only deserializes it when a field is accessed for the first time.
+
+    The subclass keeps the md5sum and type of message_class, so it can be used to
+    subscribe to a topic without breaking other subscribers of the same node, which
+    share the subscription and receive instances of the subclass. Unlike AnyMsg
+    those instances behave exactly like regular messages.
+    @param message_class: generated message class
+    @return: wire message class, cached per message class
+    """
+    wire_class = _wire_message_classes.get(message_class)
+    if wire_class is None:
+        wire_class = type(message_class.__name__, (message_class,), {
+            '__init__': _wire_init,
+            '__getattr__': _wire_getattr,
+            'deserialize': _wire_deserialize,
+            '_message_class': message_class,
+        })
+        _wire_message_classes[message_class] = wire_class
+    return wire_class
+
+
+def get_wire_size(message):
+    """
+    Return the number of bytes a message was received with.
+
+    @return: size in bytes or None if the message is not a wire message
+    """
+    try:
+        return message.__dict__.get('_wire_size')
+    except AttributeError:
+        return None
+
+
+def get_wire_buffer(message):
+    """
+    Return the serialized bytes of a wire message which has not been deserialized yet.
+
+    @return: serialized message or None
+    """
+    try:
+        return message.__dict__.get('_wire_buff')
+    except AttributeError:
+        return None
+
+
+def _wire_init(self, *args, **kwds):
+    if args or kwds:
+        self._message_class.__init__(self, *args, **kwds)
+    # otherwise the fields are filled in on first access
+
+
+def _wire_deserialize(self, buff):
+    self.__dict__['_wire_size'] = len(buff)
+    self.__dict__['_wire_buff'] = buff
+    return self
+
+
+def _wire_getattr(self, name):
+    # only called when normal lookup fails, i.e. for fields not set yet
+    message_class = self._message_class
+    if name not in message_class.__slots__:
+        raise AttributeError(name)
+    buff = self.__dict__.get('_wire_buff')
+    if buff is not None:
+        # deserialize into a separate instance, other threads reading fields of
+        # this message meanwhile must not see any partially deserialized field
+        message = message_class.__new__(message_class)
+        # generated deserializers test some fields for None before assigning them
+        for slot_name in message_class.__slots__:
+            setattr(message, slot_name, None)
+        message_class.deserialize(message, buff)
+    with _materialize_lock:
+        try:
+            # another thread might have deserialized the message meanwhile
+            return object.__getattribute__(self, name)
+        except AttributeError:
+            pass
+        if buff is None:
+            message_class.__init__(self)
+        else:
+            # fields not copied yet still end up here and wait for the lock
+            for slot_name in message_class.__slots__:
+                setattr(self, slot_name, getattr(message, slot_name))
+            del self.__dict__['_wire_buff']
+    return object.__getattribute__(self, name)
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2011, Dorian Scholz, TU Darmstadt
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#   * Neither the name of the TU Darmstadt nor the names of its
+#     contributors may be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import threading
+import unittest
+
+from rqt_topic.wire_message import get_wire_message_class, get_wire_size
+
+
+class SlowMessage(object):
+
+    """
+    Message class like the generated ones, its deserializer assigns the fields one
+    after the other and waits in between until the test releases it.
+    """
+
+    __slots__ = ['name', 'values']
+    _slot_types = ['string', 'uint8[]']
+
+    entered = None
+    released = None
+
+    def __init__(self, *args, **kwds):
+        self.name = kwds.get('name', '')
+        self.values = kwds.get('values', [])
+
+    def deserialize(self, str):
+        if self.values is None:
+            self.values = []
+        self.name = 'slow'
+        SlowMessage.entered.set()
+        SlowMessage.released.wait(10.)
+        self.values = list(bytearray(str))
+        return self
+
+
+class TestWireMessage(unittest.TestCase):
+
+    def setUp(self):
+        SlowMessage.entered = threading.Event()
+        SlowMessage.released = threading.Event()
+        self.wire_class = get_wire_message_class(SlowMessage)
+
+    def _receive(self, buff):
+        return self.wire_class().deserialize(buff)
+
+    def test_fields_deserialized_on_first_access(self):
+        SlowMessage.released.set()
+        message = self._receive(b'\x01\x02\x03')
+        self.assertEqual(get_wire_size(message), 3)
+        self.assertFalse(SlowMessage.entered.is_set())
+        self.assertEqual(message.values, [1, 2, 3])
+        self.assertEqual(message.name, 'slow')
+        self.assertTrue(isinstance(message, SlowMessage))
+
+    def test_constructed_message_is_not_wire_message(self):
+        message = self.wire_class(name='a', values=[4])
+        self.assertEqual(get_wire_size(message), None)
+        self.assertEqual(message.name, 'a')
+        self.assertEqual(message.values, [4])
+
+    def test_concurrent_reads_see_complete_message(self):
+        message = self._receive(b'\x01\x02\x03')
+        results = {}
+
+        def read(key, field_name):
+            results[key] = getattr(message, field_name)
+
+        first = threading.Thread(target=read, args=('first', 'values'))
+        first.start()
+        self.assertTrue(SlowMessage.entered.wait(10.))
+        # the first reader is in the middle of deserializing, another field
+        # must not be handed out before the message is complete
+        second = threading.Thread(target=read, args=('second', 'values'))
+        second.start()
+        third = threading.Thread(target=read, args=('third', 'name'))
+        third.start()
+        second.join(.2)
+        SlowMessage.released.set()
+        for thread in (first, second, third):
+            thread.join(10.)
+            self.assertFalse(thread.is_alive())
+        self.assertEqual(results, {'first': [1, 2, 3], 'second': [1, 2, 3], 'third': 'slow'})
+
+
+if __name__ == '__main__':
+    unittest.main()